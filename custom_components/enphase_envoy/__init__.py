@@ -11,7 +11,12 @@ from typing import Optional
 import copy
 
 import async_timeout
-from .envoy_reader import EnvoyReader, StreamData
+from .entity_writes import EntityWriteBatcher
+from .envoy_reader import (
+    EnvoyReader,
+    StreamAggregator,
+    StreamData,
+)
 import httpx
 from numpy import isin
 
@@ -35,7 +40,6 @@ from homeassistant.core import (
 from homeassistant.exceptions import ConfigEntryAuthFailed
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from homeassistant.helpers.storage import Store
-from homeassistant.util import Throttle
 
 
 from .const import (
@@ -52,6 +56,10 @@ from .const import (
     DEFAULT_REALTIME_UPDATE_THROTTLE,
     LIVE_UPDATEABLE_ENTITIES,
     DEFAULT_GETDATA_TIMEOUT,
+    DEFAULT_MAX_PARALLEL_REQUESTS,
+    DEFAULT_ADAPTIVE_POLLING_MIN_INTERVAL,
+    DEFAULT_ADAPTIVE_POLLING_MAX_INTERVAL,
+    STREAM_TOTAL_KEYS,
 )
 
 STORAGE_KEY = "envoy"
@@ -79,6 +87,18 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         disabled_endpoints = copy.copy(disabled_endpoints)
         disabled_endpoints.append("endpoint_pcu_comm_check")
 
+    # Energy counters that are integrated from the realtime stream power values
+    realtime_energy = options.get("realtime_energy", False)
+
+    # While the stream is healthy, production_report is polled less often and its
+    # values come from the stream. Its lifetime energy is only kept up to date by
+    # the stream with realtime_energy.
+    stream_reduces_polling = (
+        options.get("enable_realtime_updates", False)
+        and realtime_energy
+        and options.get("stream_reduces_polling", False)
+    )
+
     envoy_reader = EnvoyReader(
         config[CONF_HOST],
         enlighten_user=config[CONF_USERNAME],
@@ -94,8 +114,54 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             if options.get("devstatus_device_data", False)
             else "endpoint_device_data"
         ),
+        max_parallel_requests=options.get(
+            "max_parallel_requests", DEFAULT_MAX_PARALLEL_REQUESTS
+        ),
+        adaptive_polling=options.get("adaptive_polling", False),
+        adaptive_polling_min_interval=options.get(
+            "adaptive_polling_min_interval", DEFAULT_ADAPTIVE_POLLING_MIN_INTERVAL
+        ),
+        adaptive_polling_max_interval=options.get(
+            "adaptive_polling_max_interval", DEFAULT_ADAPTIVE_POLLING_MAX_INTERVAL
+        ),
+        stream_reduces_polling=stream_reduces_polling,
     )
-    await envoy_reader._sync_store(load=True)
+
+    # Keys of the phase values the realtime meter stream delivers
+    phase_keys = [
+        (
+            phase,
+            "production_" + phase,
+            "voltage_" + phase,
+            "ampere_" + phase,
+            "apparent_power_" + phase,
+            "power_factor_" + phase,
+            "reactive_power_" + phase,
+            "frequency_" + phase,
+            "consumption_" + phase,
+        )
+        for phase in ["l1", "l2", "l3"]
+    ]
+
+    energy_keys = {
+        f"{power}_{phase}": (f"daily_{power}_{phase}", f"lifetime_{power}_{phase}")
+        for power in ["production", "consumption"]
+        for phase in ["l1", "l2", "l3"]
+    }
+
+    # Values of production_report that come from the stream, while it reduces the
+    # polling of production_report. The energy values are reconciled instead.
+    stream_keys = set()
+    if stream_reduces_polling:
+        energy_keys["production"] = ("lifetime_production",)
+        stream_keys = {
+            key
+            for _, *keys in phase_keys
+            for key in keys
+            if not key.startswith("consumption_")
+        }
+        stream_keys.update(STREAM_TOTAL_KEYS)
+        stream_keys.discard("lifetime_production")
 
     async def async_update_data():
         """Fetch data from API endpoint."""
@@ -113,6 +179,28 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             # The envoy_reader.all_values will adjust production values, based on option key
             data = envoy_reader.all_values
 
+            if stream_keys and envoy_reader.is_stream_healthy:
+                # production_report is polled less often, the stream is more recent
+                for key in stream_keys & (coordinator.data or {}).keys():
+                    data[key] = coordinator.data[key]
+
+            if options.get("enable_realtime_updates", False):
+                health = envoy_reader.stream_health
+                data["stream_state"] = health.state
+                data["stream_events_per_second"] = health.events_per_second
+                data["stream_reconnects"] = health.reconnects
+
+            if options.get("endpoint_diagnostics", False):
+                data["endpoint_cycle_time"] = round(envoy_reader.cycle_time * 1000, 1)
+                data["endpoint_slowest"] = envoy_reader.slowest_endpoint
+
+            if realtime_energy:
+                for keys in energy_keys.values():
+                    for key in keys:
+                        data[key] = envoy_reader.stream_energy.reconcile(
+                            key, data.get(key)
+                        )
+
         await envoy_reader._sync_store()
         return data
 
@@ -126,30 +214,39 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         ),
     )
 
+    await envoy_reader.open()
     try:
-        await coordinator.async_config_entry_first_refresh()
-    except ConfigEntryAuthFailed:
-        envoy_reader.get_inverters = False
-        await coordinator.async_config_entry_first_refresh()
+        await envoy_reader._sync_store(load=True)
 
-    if not entry.unique_id:
         try:
-            serial = await envoy_reader.get_full_serial_number()
-        except httpx.HTTPError:
-            pass
-        else:
-            hass.config_entries.async_update_entry(entry, unique_id=serial)
-
-    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {
-        COORDINATOR: coordinator,
-        NAME: name,
-        READER: envoy_reader,
-    }
-    live_entities = hass.data[DOMAIN][entry.entry_id].setdefault(
-        LIVE_UPDATEABLE_ENTITIES, {}
-    )
+            await coordinator.async_config_entry_first_refresh()
+        except ConfigEntryAuthFailed:
+            envoy_reader.get_inverters = False
+            await coordinator.async_config_entry_first_refresh()
+
+        if not entry.unique_id:
+            try:
+                serial = await envoy_reader.get_full_serial_number()
+            except httpx.HTTPError:
+                pass
+            else:
+                hass.config_entries.async_update_entry(entry, unique_id=serial)
+
+        hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {
+            COORDINATOR: coordinator,
+            NAME: name,
+            READER: envoy_reader,
+        }
+        live_entities = hass.data[DOMAIN][entry.entry_id].setdefault(
+            LIVE_UPDATEABLE_ENTITIES, {}
+        )
 
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+        await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    except BaseException:
+        # The setup is retried (or given up) with a new reader, close this one
+        hass.data.get(DOMAIN, {}).pop(entry.entry_id, None)
+        await envoy_reader.aclose()
+        raise
 
     # Finally, start measuring production counters
     time_between_realtime_updates = timedelta(
@@ -193,33 +290,111 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         upload_grid_profile,
     )
 
-    @Throttle(time_between_realtime_updates)
+    # Publish the mean of each realtime update window, with min/max as attributes
+    stream_aggregator = StreamAggregator(time_between_realtime_updates.total_seconds())
+
+    # Live entities with a new value, written together once per event loop tick
+    schedule_write = EntityWriteBatcher(hass.loop).schedule_write
+
+    def add_stream_totals(streamdata: StreamData):
+        """Add the totals of production_report, calculated from the phases."""
+        phases = list(streamdata.production.values())
+        if not phases:
+            return
+        watts = sum(phase.watts for phase in phases)
+        volt_ampere = sum(phase.volt_ampere for phase in phases)
+        stream_aggregator.add(
+            "production", envoy_reader.process_production_value(watts)
+        )
+        stream_aggregator.add("ampere", sum(phase.amps for phase in phases))
+        stream_aggregator.add("apparent_power", volt_ampere)
+        stream_aggregator.add("reactive_power", sum(phase.var for phase in phases))
+        stream_aggregator.add(
+            "power_factor", round(watts / volt_ampere, 2) if volt_ampere else None
+        )
+        # The mean of the phases, as a single value for all phases
+        stream_aggregator.add(
+            "voltage", sum(phase.volt for phase in phases) / len(phases)
+        )
+        stream_aggregator.add(
+            "frequency", sum(phase.hz for phase in phases) / len(phases)
+        )
+        envoy_reader.stream_energy.add(
+            "production", watts, energy_keys["production"], time.monotonic()
+        )
+
     def update_production_meters(streamdata: StreamData):
-        new_data = {}
-        for phase in ["l1", "l2", "l3"]:
-            production_watts = envoy_reader.process_production_value(
-                streamdata.production[phase].watts
-            )
-            new_data.update(
-                {
-                    "production_" + phase: production_watts,
-                    "voltage_" + phase: streamdata.production[phase].volt,
-                    "ampere_" + phase: streamdata.production[phase].amps,
-                    "apparent_power_" + phase: streamdata.production[phase].volt_ampere,
-                    "power_factor" + phase: streamdata.production[phase].pf,
-                    "reactive_power_" + phase: streamdata.production[phase].var,
-                    "frequency_" + phase: streamdata.production[phase].hz,
-                    "consumption_" + phase: streamdata.consumption[phase].watts,
-                }
+        for (
+            phase,
+            production_key,
+            voltage_key,
+            ampere_key,
+            apparent_power_key,
+            power_factor_key,
+            reactive_power_key,
+            frequency_key,
+            consumption_key,
+        ) in phase_keys:
+            production = streamdata.production[phase]
+            stream_aggregator.add(
+                production_key,
+                envoy_reader.process_production_value(production.watts),
             )
+            stream_aggregator.add(voltage_key, production.volt)
+            stream_aggregator.add(ampere_key, production.amps)
+            stream_aggregator.add(apparent_power_key, production.volt_ampere)
+            stream_aggregator.add(power_factor_key, production.pf)
+            stream_aggregator.add(reactive_power_key, production.var)
+            stream_aggregator.add(frequency_key, production.hz)
+            stream_aggregator.add(consumption_key, streamdata.consumption[phase].watts)
+
+            if realtime_energy:
+                now = time.monotonic()
+                envoy_reader.stream_energy.add(
+                    production_key, production.watts, energy_keys[production_key], now
+                )
+                envoy_reader.stream_energy.add(
+                    consumption_key,
+                    streamdata.consumption[phase].watts,
+                    energy_keys[consumption_key],
+                    now,
+                )
 
-        for key, value in new_data.items():
-            if live_entities.get(key, False) and coordinator.data.get(key) != value:
+        if stream_reduces_polling:
+            add_stream_totals(streamdata)
+
+        if not stream_aggregator.window_finished():
+            return
+
+        if realtime_energy:
+            for keys in energy_keys.values():
+                for key in keys:
+                    entity = live_entities.get(key, False)
+                    value = envoy_reader.stream_energy.value(key)
+                    if (
+                        entity
+                        and value is not None
+                        and entity.is_significant_change(value)
+                    ):
+                        coordinator.data[key] = value
+                        schedule_write(entity)
+
+            if envoy_reader.stream_energy.save_due:
+                # Keep the integrated energy over a restart
+                hass.async_create_task(envoy_reader._sync_store())
+
+        for key, (value, minimum, maximum) in stream_aggregator.flush().items():
+            entity = live_entities.get(key, False)
+            if not entity:
+                continue
+
+            entity.set_window(minimum, maximum)
+            if entity.is_significant_change(value):
                 # Update the value in the coordinator
                 coordinator.data[key] = value
 
                 # Let hass know the data is updated
-                live_entities[key].async_write_ha_state()
+                schedule_write(entity)
 
     async def read_realtime_updates() -> None:
         while (
@@ -237,9 +412,10 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
                 )
                 return
 
-            _LOGGER.warning("Re-connecting /stream/meter")
-            # throttle reconnect attempts
-            await asyncio.sleep(30)
+            # Back off (with jitter) when connections keep failing
+            delay = envoy_reader.stream_health.reconnect_delay()
+            _LOGGER.warning("Re-connecting /stream/meter in %.0f seconds", delay)
+            await asyncio.sleep(delay)
 
     if options.get("enable_realtime_updates", False):
         # Setup a home assistant task (that will never die...)
@@ -250,6 +426,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     async def _async_stop(_: Event) -> None:
         _LOGGER.debug("Stopping loop for /stream/meter")
         await _cancel_realtime_task(task)
+        await envoy_reader._sync_store(force=True)
 
         hass.data[DOMAIN][entry.entry_id]["realtime_loop"] = False
 
@@ -290,5 +467,7 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        envoy_reader = hass.data[DOMAIN].pop(entry.entry_id)[READER]
+        await envoy_reader._sync_store()
+        await envoy_reader.aclose()
     return unload_ok
@@ -202,10 +202,8 @@ class EnvoyInverterEntity(CoordinatorEntity, BinarySensorEntity):
     def is_on(self) -> bool:
         """Return the status of the requested attribute."""
         if self.entity_description.key.startswith("inverter_data_"):
-            return (
-                self.coordinator.data.get("inverter_device_data")
-                .get(self._device_serial_number)
-                .get(self.entity_description.key[14:])
+            return self.coordinator.data.get("inverter_device_data").value(
+                self._device_serial_number, self.entity_description.key[14:]
             )
         if self.entity_description.key.startswith("inverter_info_"):
             return (
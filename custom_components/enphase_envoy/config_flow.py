@@ -31,10 +31,15 @@ from .const import (
     DEFAULT_REALTIME_UPDATE_THROTTLE,
     ENABLE_ADDITIONAL_METRICS,
     DEFAULT_GETDATA_TIMEOUT,
+    DEFAULT_MAX_PARALLEL_REQUESTS,
+    DEFAULT_REALTIME_MAX_SILENCE,
+    DEFAULT_ADAPTIVE_POLLING_MIN_INTERVAL,
+    DEFAULT_ADAPTIVE_POLLING_MAX_INTERVAL,
+    DEFAULT_REALTIME_DEADBANDS,
+    DEFAULT_REALTIME_DEADBAND_RELATIVE,
 )
 from .envoy_endpoints import ENVOY_ENDPOINTS
 
-
 _LOGGER = logging.getLogger(__name__)
 
 ENVOY = "Envoy"
@@ -50,13 +55,18 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> EnvoyRead
         enlighten_serial_num=data[CONF_SERIAL],
     )
 
+    await envoy_reader.open()
     try:
         await envoy_reader.get_data()
-    except EnlightenError as err:
-        raise InvalidAuth from err
-    except (EnvoyError, httpx.ConnectError) as err:
-        raise CannotConnect from err
-
+    except BaseException as err:
+        await envoy_reader.aclose()
+        if isinstance(err, EnlightenError):
+            raise InvalidAuth from err
+        if isinstance(err, (EnvoyError, httpx.ConnectError)):
+            raise CannotConnect from err
+        raise
+
+    # The reader is still open, the caller closes it
     return envoy_reader
 
 
@@ -190,17 +200,21 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 data = user_input.copy()
                 data[CONF_NAME] = self._async_envoy_name()
 
-                if self._reauth_entry:
-                    self.hass.config_entries.async_update_entry(
-                        self._reauth_entry,
-                        data=data,
-                    )
-                    return self.async_abort(reason="reauth_successful")
+                try:
+                    if self._reauth_entry:
+                        self.hass.config_entries.async_update_entry(
+                            self._reauth_entry,
+                            data=data,
+                        )
+                        return self.async_abort(reason="reauth_successful")
 
-                if not self.unique_id and await self._async_set_unique_id_from_envoy(
-                    envoy_reader
-                ):
-                    data[CONF_NAME] = self._async_envoy_name()
+                    if (
+                        not self.unique_id
+                        and await self._async_set_unique_id_from_envoy(envoy_reader)
+                    ):
+                        data[CONF_NAME] = self._async_envoy_name()
+                finally:
+                    await envoy_reader.aclose()
 
                 if self.unique_id:
                     self._abort_if_unique_id_configured({CONF_HOST: data[CONF_HOST]})
@@ -234,8 +248,19 @@ class EnvoyOptionsFlowHandler(config_entries.OptionsFlow):
     async def async_step_user(self, user_input=None):
         """Handle a flow initialized by the user."""
 
+        errors = {}
         if user_input is not None:
-            return self.async_create_entry(title="", data=user_input)
+            if user_input.get(
+                "adaptive_polling_min_interval", DEFAULT_ADAPTIVE_POLLING_MIN_INTERVAL
+            ) > user_input.get(
+                "adaptive_polling_max_interval", DEFAULT_ADAPTIVE_POLLING_MAX_INTERVAL
+            ):
+                errors["adaptive_polling_max_interval"] = "max_interval_below_min"
+            else:
+                return self.async_create_entry(title="", data=user_input)
+
+        # Show the rejected input again, instead of the current options
+        options = {**self.config_entry.options, **(user_input or {})}
 
         optional_endpoints = {
             f"endpoint_{key}": key
@@ -244,63 +269,116 @@ class EnvoyOptionsFlowHandler(config_entries.OptionsFlow):
         }
         disabled_endpoints = [
             ep
-            for ep in self.config_entry.options.get("disabled_endpoints", [])
+            for ep in options.get("disabled_endpoints", [])
             if ep in optional_endpoints.keys()
         ]
 
         schema = {
             vol.Optional(
                 "time_between_update",
-                default=self.config_entry.options.get(
-                    "time_between_update", DEFAULT_SCAN_INTERVAL
-                ),
+                default=options.get("time_between_update", DEFAULT_SCAN_INTERVAL),
             ): vol.All(vol.Coerce(int), vol.Range(min=5)),
             vol.Optional(
                 "getdata_timeout",
-                default=self.config_entry.options.get(
-                    "getdata_timeout", DEFAULT_GETDATA_TIMEOUT
-                ),
+                default=options.get("getdata_timeout", DEFAULT_GETDATA_TIMEOUT),
             ): vol.All(vol.Coerce(int), vol.Range(min=30)),
             vol.Optional(
-                "disable_negative_production",
-                default=self.config_entry.options.get(
-                    "disable_negative_production", False
+                "max_parallel_requests",
+                default=options.get(
+                    "max_parallel_requests", DEFAULT_MAX_PARALLEL_REQUESTS
                 ),
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=10)),
+            vol.Optional(
+                "adaptive_polling",
+                default=options.get("adaptive_polling", False),
+            ): bool,
+            vol.Optional(
+                "adaptive_polling_min_interval",
+                default=options.get(
+                    "adaptive_polling_min_interval",
+                    DEFAULT_ADAPTIVE_POLLING_MIN_INTERVAL,
+                ),
+            ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+            vol.Optional(
+                "adaptive_polling_max_interval",
+                default=options.get(
+                    "adaptive_polling_max_interval",
+                    DEFAULT_ADAPTIVE_POLLING_MAX_INTERVAL,
+                ),
+            ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+            vol.Optional(
+                "disable_negative_production",
+                default=options.get("disable_negative_production", False),
             ): bool,
             vol.Optional(
                 "enable_realtime_updates",
-                default=self.config_entry.options.get("enable_realtime_updates", False),
+                default=options.get("enable_realtime_updates", False),
             ): bool,
             vol.Optional(
                 "realtime_update_throttle",
-                default=self.config_entry.options.get(
+                default=options.get(
                     "realtime_update_throttle", DEFAULT_REALTIME_UPDATE_THROTTLE
                 ),
             ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+            vol.Optional(
+                "stream_reduces_polling",
+                default=options.get("stream_reduces_polling", False),
+            ): bool,
+            vol.Optional(
+                "realtime_energy",
+                default=options.get("realtime_energy", False),
+            ): bool,
+            vol.Optional(
+                "realtime_deadband",
+                default=options.get("realtime_deadband", True),
+            ): bool,
+            **{
+                vol.Optional(
+                    f"realtime_deadband_{quantity}",
+                    default=options.get(f"realtime_deadband_{quantity}", default),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0))
+                for quantity, default in DEFAULT_REALTIME_DEADBANDS.items()
+            },
+            vol.Optional(
+                "realtime_deadband_relative",
+                default=options.get(
+                    "realtime_deadband_relative", DEFAULT_REALTIME_DEADBAND_RELATIVE
+                ),
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+            vol.Optional(
+                "realtime_max_silence",
+                default=options.get(
+                    "realtime_max_silence", DEFAULT_REALTIME_MAX_SILENCE
+                ),
+            ): vol.All(vol.Coerce(int), vol.Range(min=0)),
             vol.Optional(
                 ENABLE_ADDITIONAL_METRICS,
-                default=self.config_entry.options.get(ENABLE_ADDITIONAL_METRICS, False),
+                default=options.get(ENABLE_ADDITIONAL_METRICS, False),
             ): bool,
             vol.Optional(
                 "enable_pcu_comm_check",
-                default=self.config_entry.options.get("enable_pcu_comm_check", False),
+                default=options.get("enable_pcu_comm_check", False),
             ): bool,
             vol.Optional(
                 "devstatus_device_data",
-                default=self.config_entry.options.get("devstatus_device_data", False),
+                default=options.get("devstatus_device_data", False),
             ): bool,
             vol.Optional(
                 "lifetime_production_correction",
-                default=self.config_entry.options.get(
-                    "lifetime_production_correction", 0
-                ),
+                default=options.get("lifetime_production_correction", 0),
             ): vol.All(vol.Coerce(int)),
+            vol.Optional(
+                "endpoint_diagnostics",
+                default=options.get("endpoint_diagnostics", False),
+            ): bool,
             vol.Optional(
                 "disabled_endpoints",
                 description={"suggested_value": disabled_endpoints},
             ): cv.multi_select(optional_endpoints),
         }
-        return self.async_show_form(step_id="user", data_schema=vol.Schema(schema))
+        return self.async_show_form(
+            step_id="user", data_schema=vol.Schema(schema), errors=errors
+        )
 
 
 class CannotConnect(HomeAssistantError):
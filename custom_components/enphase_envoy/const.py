@@ -45,7 +45,20 @@ READER = "reader"
 
 DEFAULT_SCAN_INTERVAL = 60  # default in seconds
 DEFAULT_REALTIME_UPDATE_THROTTLE = 10
+DEFAULT_REALTIME_MAX_SILENCE = 300
 DEFAULT_GETDATA_TIMEOUT = 60
+DEFAULT_MAX_PARALLEL_REQUESTS = 1
+DEFAULT_ADAPTIVE_POLLING_MIN_INTERVAL = 0
+DEFAULT_ADAPTIVE_POLLING_MAX_INTERVAL = 900
+# Absolute realtime deadband per quantity, option realtime_deadband_<quantity>
+DEFAULT_REALTIME_DEADBANDS = {
+    "power": 5,  # W, VA and var
+    "voltage": 0.5,  # V
+    "current": 0.05,  # A
+    "frequency": 0.05,  # Hz
+    "power_factor": 0.01,
+}
+DEFAULT_REALTIME_DEADBAND_RELATIVE = 1  # %, only for power and current
 
 CONF_SERIAL = "serial"
 
@@ -518,6 +531,45 @@ SENSORS = (
         device_class=SensorDeviceClass.TIMESTAMP,
         entity_category=EntityCategory.DIAGNOSTIC,
     ),
+    SensorEntityDescription(
+        key="stream_state",
+        name="Realtime Stream State",
+        device_class=SensorDeviceClass.ENUM,
+        options=["disconnected", "connecting", "connected", "stalled"],
+        entity_category=EntityCategory.DIAGNOSTIC,
+        icon="mdi:lan-connect",
+    ),
+    SensorEntityDescription(
+        key="stream_events_per_second",
+        name="Realtime Stream Events",
+        native_unit_of_measurement="events/s",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        suggested_display_precision=2,
+        icon="mdi:chart-line",
+    ),
+    SensorEntityDescription(
+        key="stream_reconnects",
+        name="Realtime Stream Reconnects",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        icon="mdi:lan-disconnect",
+    ),
+    SensorEntityDescription(
+        key="endpoint_cycle_time",
+        name="Endpoint Update Time",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.DURATION,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        icon="mdi:timer-outline",
+    ),
+    SensorEntityDescription(
+        key="endpoint_slowest",
+        name="Slowest Endpoint",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        icon="mdi:timer-sand",
+    ),
 )
 ADDITIONAL_METRICS.extend(
     [
@@ -527,6 +579,11 @@ ADDITIONAL_METRICS.extend(
 )
 
 PHASE_SENSORS = []
+# Realtime updates of a phase sensor are only written when the value changed more
+# than max(absolute, relative * previous value). The thresholds are options per
+# quantity, see REALTIME_DEADBAND_QUANTITIES and DEFAULT_REALTIME_DEADBANDS.
+REALTIME_DEADBAND_QUANTITIES = {}
+REALTIME_DEADBAND_RELATIVE_QUANTITIES = ("power", "current")
 for phase in ["l1", "l2", "l3"]:
     PHASE_SENSORS.extend(
         [
@@ -684,6 +741,42 @@ for phase in ["l1", "l2", "l3"]:
             f"power_factor_{phase}",
         ]
     )
+    REALTIME_DEADBAND_QUANTITIES.update(
+        {
+            f"production_{phase}": "power",
+            f"consumption_{phase}": "power",
+            f"voltage_{phase}": "voltage",
+            f"ampere_{phase}": "current",
+            f"apparent_power_{phase}": "power",
+            f"reactive_power_{phase}": "power",
+            f"frequency_{phase}": "frequency",
+            f"power_factor_{phase}": "power_factor",
+        }
+    )
+
+# Totals of production_report, that are calculated from the realtime stream when
+# it reduces the polling of production_report (option stream_reduces_polling)
+STREAM_TOTAL_KEYS = (
+    "production",
+    "voltage",
+    "ampere",
+    "apparent_power",
+    "power_factor",
+    "reactive_power",
+    "frequency",
+    "lifetime_production",
+)
+REALTIME_DEADBAND_QUANTITIES.update(
+    {
+        "production": "power",
+        "voltage": "voltage",
+        "ampere": "current",
+        "apparent_power": "power",
+        "power_factor": "power_factor",
+        "reactive_power": "power",
+        "frequency": "frequency",
+    }
+)
 
 BINARY_SENSORS = (
     BinarySensorEntityDescription(
@@ -10,7 +10,7 @@ from homeassistant.const import CONF_HOST, CONF_USERNAME, CONF_PASSWORD
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 
-from .const import COORDINATOR, DOMAIN
+from .const import COORDINATOR, DOMAIN, READER
 
 TO_REDACT = {
     CONF_HOST,
@@ -24,11 +24,16 @@ async def async_get_config_entry_diagnostics(
 ) -> dict[str, Any]:
     """Return diagnostics for a config entry."""
     coordinator: DataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR]
+    envoy_reader = hass.data[DOMAIN][entry.entry_id][READER]
 
     return async_redact_data(
         {
             "entry": entry.as_dict(),
             "data": coordinator.data,
+            "endpoint_instrumentation": envoy_reader.endpoint_instrumentation,
+            "slowest_endpoint": envoy_reader.slowest_endpoint,
+            "stream_malformed_frames": envoy_reader.stream_malformed_frames,
+            "stream_health": envoy_reader.stream_health.as_dict(),
         },
         TO_REDACT,
     )
@@ -0,0 +1,20 @@
+class EntityWriteBatcher:
+    """Writes the state of entities with a new value once per event loop tick.
+
+    A stream event changes many entities and events can arrive in bursts, so an
+    entity that changed several times within a tick is only written once."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.dirty_entities = {}
+
+    def schedule_write(self, entity):
+        if not self.dirty_entities:
+            self.loop.call_soon(self.write_dirty_entities)
+        self.dirty_entities[entity] = True
+
+    def write_dirty_entities(self):
+        entities = list(self.dirty_entities)
+        self.dirty_entities.clear()
+        for entity in entities:
+            entity.async_write_ha_state()
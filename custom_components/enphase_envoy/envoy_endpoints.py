@@ -30,6 +30,8 @@ ENVOY_ENDPOINTS = {
         "cache": 0,
         "installer_required": False,
         "optional": False,
+        # Slowed down to this cache time while the meter stream delivers the data
+        "stream_cache": 300,
     },
     "production_power": {
         "url": "https://{}/ivp/mod/603980032/mode/power",
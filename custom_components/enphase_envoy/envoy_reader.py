@@ -1,6 +1,7 @@
 """Module to read production and consumption values from an Enphase Envoy on the local network."""
 
 import asyncio
+import copy
 import datetime
 import time
 import logging
@@ -13,9 +14,17 @@ import hashlib
 import base64
 import secrets
 import string
-
-from jsonpath import jsonpath
-from functools import partial
+import struct
+import operator
+import random
+import re
+import math
+
+from jsonpath import jsonpath, normalize
+from array import array
+from collections import deque
+from collections.abc import Mapping
+from functools import lru_cache, partial
 from urllib import parse
 from json.decoder import JSONDecodeError
 
@@ -34,6 +43,34 @@ ENLIGHTEN_LOGIN_URL = "https://entrez.enphaseenergy.com/login"
 ENDPOINT_URL_GET_JWT = "https://{}/auth/get_jwt"
 ENDPOINT_URL_CHECK_JWT = "https://{}/auth/check_jwt"
 
+# Time after which a valid session is checked again with the Envoy (in the background)
+SESSION_REVALIDATE_INTERVAL = 3600
+# Adaptive polling waits this fraction of the time an endpoint has been unchanged
+ADAPTIVE_POLLING_FACTOR = 0.5
+# The meter stream sends an event every second, without events it is stalled
+STREAM_STALL_TIMEOUT = 15
+# Reconnect delays of the meter stream, doubled after every failed connection
+STREAM_RECONNECT_MIN_DELAY = 5
+STREAM_RECONNECT_MAX_DELAY = 300
+
+STREAM_STATE_DISCONNECTED = "disconnected"
+STREAM_STATE_CONNECTING = "connecting"
+STREAM_STATE_CONNECTED = "connected"
+STREAM_STATE_STALLED = "stalled"
+
+# Recordings of the meter stream: the magic, followed by records of a header
+# (seconds since the start of the recording, chunk length) and the raw chunk
+STREAM_RECORDING_MAGIC = b"ENVOYSTREAM1\n"
+STREAM_RECORD_HEADER = struct.Struct("<dI")
+
+# What a stream subscription does when its queue is full
+STREAM_POLICY_DROP_OLDEST = "drop_oldest"
+STREAM_POLICY_LATEST = "latest"  # only keep the most recent event
+
+# Keep a few connections to the Envoy alive between requests, so we do not need
+# a new TCP connect and TLS handshake for every endpoint that is polled.
+HTTPX_LIMITS = httpx.Limits(max_keepalive_connections=5, keepalive_expiry=30)
+
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -65,7 +102,310 @@ def has_metering_setup(json):
     return json["production"][1]["activeCount"] > 0
 
 
+_FILTER_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+_FILTER_CONDITION = re.compile(
+    r"^@\.([A-Za-z_][A-Za-z0-9_]*)\s*(==|!=|>=|<=|>|<)\s*"
+    r"(?:'([^']*)'|\"([^\"]*)\"|(-?[0-9]+(?:\.[0-9]+)?))$"
+)
+_SLICE = re.compile(r"(-?[0-9]*):(-?[0-9]*):?(-?[0-9]*)$")
+
+
+def _compile_filter(expression):
+    """Compile a jsonpath filter like @.type=='eim' && @.activeCount > 0 to a predicate.
+
+    Only comparisons of a direct field with a string or number literal, combined
+    with either && or ||, are supported. Returns None for anything else."""
+    if "&&" in expression and "||" in expression:
+        return None
+    combine = any if "||" in expression else all
+
+    conditions = []
+    for part in re.split(r"&&|\|\|", expression):
+        match = _FILTER_CONDITION.match(part.strip())
+        if not match or match.group(1) == "length":
+            return None
+        field, op, single_quoted, double_quoted, number = match.groups()
+        if number is not None:
+            value = float(number) if "." in number else int(number)
+        else:
+            value = single_quoted if single_quoted is not None else double_quoted
+        conditions.append((field, _FILTER_OPERATORS[op], value))
+
+    def predicate(obj):
+        # Just like the jsonpath eval, any error (missing key, wrong type) is a mismatch
+        try:
+            return combine(op(obj[field], value) for field, op, value in conditions)
+        except Exception:
+            return False
+
+    return predicate
+
+
+def _compile_step(token):
+    """Compile a single normalized jsonpath token, returns None if unsupported."""
+    if token == "*":
+
+        def step(obj, rest, result):
+            if isinstance(obj, list):
+                for child in obj:
+                    rest(child, result)
+            elif isinstance(obj, dict):
+                for child in obj.values():
+                    rest(child, result)
+
+        return step
+
+    if token == "..":
+
+        def step(obj, rest, result):
+            rest(obj, result)
+            if isinstance(obj, list):
+                for child in obj:
+                    step(child, rest, result)
+            elif isinstance(obj, dict):
+                for child in obj.values():
+                    step(child, rest, result)
+
+        return step
+
+    if token.startswith("?(") and token.endswith(")"):
+        predicate = _compile_filter(token[2:-1])
+        if predicate is None:
+            return None
+
+        def step(obj, rest, result):
+            if isinstance(obj, dict) and token in obj:
+                rest(obj[token], result)
+            elif isinstance(obj, list):
+                for child in obj:
+                    if predicate(child):
+                        rest(child, result)
+            elif isinstance(obj, dict):
+                for child in obj.values():
+                    if predicate(child):
+                        rest(child, result)
+
+        return step
+
+    if token in ("", "!") or token.startswith("(") or _SLICE.match(token):
+        return None
+
+    if "," in token:
+        pieces = [_compile_step(piece) for piece in re.split(r"'?,'?", token)]
+        if None in pieces:
+            return None
+
+        def step(obj, rest, result):
+            if isinstance(obj, dict) and token in obj:
+                rest(obj[token], result)
+            else:
+                for piece in pieces:
+                    piece(obj, rest, result)
+
+        return step
+
+    index = int(token) if token.isdigit() else None
+
+    def step(obj, rest, result):
+        if isinstance(obj, dict):
+            if token in obj:
+                rest(obj[token], result)
+        elif index is not None and isinstance(obj, list):
+            if len(obj) > index:
+                rest(obj[index], result)
+
+    return step
+
+
+@lru_cache(maxsize=None)
+def compile_jsonpath(path):
+    """Compile a jsonpath expression once into a function that resolves it.
+
+    The returned function gives the same result as jsonpath(obj, path): a list
+    with all matches, or False. Expressions that are not supported by the
+    compiler fall back to the jsonpath library."""
+    tokens = normalize(path)
+    if tokens.startswith("$;"):
+        tokens = tokens[2:]
+    steps = [_compile_step(token) for token in tokens.split(";")]
+
+    if None in steps:
+        _LOGGER.debug("Using jsonpath library for unsupported path %s", path)
+        return lambda obj: jsonpath(obj, path)
+
+    def store(obj, result):
+        result.append(obj)
+
+    def chain(step, rest):
+        return lambda obj, result: step(obj, rest, result)
+
+    # Build the resolver back to front, so every step calls the remaining steps.
+    resolve = store
+    for step in reversed(steps):
+        resolve = chain(step, resolve)
+
+    def accessor(obj):
+        if not obj:
+            return False
+        result = []
+        resolve(obj, result)
+        return result or False
+
+    return accessor
+
+
+# Typecode of the DeviceTelemetry column of a device field: "d" for floats, "q"
+# for integers and "b" for booleans. Other fields, and columns with a value that
+# does not fit the type, are kept in a list.
+DEVICE_FIELD_TYPES = {
+    "active": "b",
+    "gone": "b",
+    "watts": "q",
+    "watts_max": "q",
+    "watt_hours_today": "q",
+    "watt_hours_yesterday": "q",
+    "watt_hours_week": "q",
+    "ac_voltage": "d",
+    "ac_frequency": "d",
+    "ac_current": "d",
+    "ac_power": "q",
+    "dc_voltage": "d",
+    "dc_current": "d",
+    "frequency": "d",
+    "voltage_l1": "d",
+    "voltage_l2": "d",
+    "voltage_l3": "d",
+    "lifetime_power": "d",
+    "temperature": "q",
+    "rssi": "q",
+    "issi": "q",
+    "conversion_error": "q",
+    "conversion_error_cycles": "q",
+    "state_change_count": "q",
+    "last_reading": "q",
+}
+INT_MISSING = -(2**63)
+_MISSING = {"d": math.nan, "q": INT_MISSING, "b": -1}
+
+
+def _column_fits(column, value):
+    if isinstance(column, list):
+        return True
+    if column.typecode == "b":
+        return type(value) is bool
+    if column.typecode == "q":
+        return type(value) is int and INT_MISSING < value < 2**63
+    return type(value) is float
+
+
+def _column_value(column, row):
+    """Return the value in a column, or None if it is missing."""
+    value = column[row]
+    if isinstance(column, list):
+        return value
+    if column.typecode == "d":
+        return None if math.isnan(value) else value
+    if column.typecode == "q":
+        return None if value == INT_MISSING else value
+    return None if value == -1 else bool(value)
+
+
+class DeviceTelemetry(Mapping):
+    """Column-oriented store of the data of one type of device.
+
+    Every serial number has a row and every field a column, a typed array where
+    possible, so a large fleet takes little memory and a value is read in O(1) with
+    value(). It is also a read-only mapping of serial number to a mapping of the
+    fields of that device, like the dict of dicts it replaces."""
+
+    def __init__(self):
+        self.index = {}  # serial number -> row
+        self.columns = {}  # field -> array or list
+
+    def add(self, serial, values):
+        """Add the values of a device, or update them if it was added before."""
+        row = self.index.get(serial)
+        if row is None:
+            row = self.index[serial] = len(self.index)
+            for column in self.columns.values():
+                column.append(
+                    None if isinstance(column, list) else _MISSING[column.typecode]
+                )
+
+        for field, value in values.items():
+            column = self.columns.get(field)
+            if column is None:
+                typecode = DEVICE_FIELD_TYPES.get(field)
+                if typecode is None:
+                    column = [None] * len(self.index)
+                else:
+                    column = array(typecode, [_MISSING[typecode]]) * len(self.index)
+                self.columns[field] = column
+
+            if not _column_fits(column, value):
+                column = self.columns[field] = [
+                    _column_value(column, r) for r in range(len(column))
+                ]
+            column[row] = value
+
+    def value(self, serial, field):
+        """Return a field of a device, or None if it is not there."""
+        row = self.index.get(serial)
+        column = self.columns.get(field)
+        if row is None or column is None:
+            return None
+        return _column_value(column, row)
+
+    def __getitem__(self, serial):
+        return DeviceTelemetryRow(self, self.index[serial])
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return repr({serial: dict(device) for serial, device in self.items()})
+
+
+class DeviceTelemetryRow(Mapping):
+    """The fields of one device in a DeviceTelemetry."""
+
+    __slots__ = ("_telemetry", "_row")
+
+    def __init__(self, telemetry, row):
+        self._telemetry = telemetry
+        self._row = row
+
+    def __getitem__(self, field):
+        column = self._telemetry.columns[field]
+        value = _column_value(column, self._row)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __iter__(self):
+        for field, column in self._telemetry.columns.items():
+            if _column_value(column, self._row) is not None:
+                yield field
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
 def parse_devstatus(data):
+    """Return {device type: DeviceTelemetry} of a devstatus response."""
     pcu_data = {
         "sn": "serialNumber",
         "type": "devType",
@@ -79,7 +419,7 @@ def parse_devstatus(data):
     }
     device_type = {1: "pcu", 12: "nsrb"}
 
-    idd = []
+    telemetry = {"pcu": DeviceTelemetry(), "nsrb": DeviceTelemetry()}
     for itemtype, content in data.items():
         if itemtype == "pcu":
             dataset = pcu_data
@@ -104,12 +444,15 @@ def parse_devstatus(data):
                     device_data[field] = not value
                 else:
                     device_data[field] = value
-            idd.append(device_data)
+            telemetry.setdefault(device_data["type"], DeviceTelemetry()).add(
+                device_data["sn"], device_data
+            )
 
-    return idd
+    return telemetry
 
 
 def parse_devicedata(data):
+    """Return {device type: DeviceTelemetry} of a device_data response."""
     pcu_data = {
         "type": "devName",
         "sn": "sn",
@@ -147,7 +490,7 @@ def parse_devicedata(data):
         "last_reading": "channels[0].lastReading.endDate",
     }
 
-    idd = []
+    telemetry = {"pcu": DeviceTelemetry(), "nsrb": DeviceTelemetry()}
     for device in data.values():
         if isinstance(device, dict) and device.get("active") is True:
             if device.get("devName") == "pcu":
@@ -159,7 +502,7 @@ def parse_devicedata(data):
 
             device_data = {}
             for field, path in dataset.items():
-                result = jsonpath(device, path)
+                result = compile_jsonpath(path)(device)
                 if result:
                     value = result[0]
                     _LOGGER.debug(f"Found device data field {field}: {value}")
@@ -171,9 +514,9 @@ def parse_devicedata(data):
                         device_data[field] = int(value) * 0.000277778
                     else:
                         device_data[field] = value
-            idd.append(device_data)
+            telemetry[device["devName"]].add(device_data.get("sn"), device_data)
 
-    return idd
+    return telemetry
 
 
 def merge_metersdata(data1=[], data2=[]):
@@ -209,16 +552,15 @@ class FileData:
     def __init__(self, file):
         self.file = file
 
+        self.content = read_file_as_bytes(file)
         if file.endswith(".json"):
             self.content_type = "application/json"
-            with open(file) as json_file:
-                self.json_data = json.load(json_file)
-                _LOGGER.debug(f"File '{file}' JSON data: {self.json_data}")
+            self.json_data = json.loads(self.content)
+            _LOGGER.debug(f"File '{file}' JSON data: {self.json_data}")
         elif file.endswith(".xml"):
             self.content_type = "application/xml"
-            with open(file) as xml_file:
-                self.text = xml_file.read()
-                _LOGGER.debug(f"File '{file}' text: {self.text}")
+            self.text = self.content.decode()
+            _LOGGER.debug(f"File '{file}' text: {self.text}")
 
     @property
     def status_code(self):
@@ -244,9 +586,276 @@ class FileData:
             return self.url.split("/")[-1]
 
 
+class SSEFrameParser:
+    """Incremental parser for a server-sent events stream.
+
+    Chunks of bytes are fed as they are received, and the data of every complete
+    event is returned. Events may be split over chunks, or multiple events may be
+    in one chunk. Lines end with LF or CRLF, and the buffer is reused for the
+    whole stream."""
+
+    MAX_EVENT_SIZE = 65536
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.malformed_frames = 0
+        self._data = []
+        self._data_size = 0
+
+    def reset(self):
+        """Drop a partial event, for instance after a reconnect."""
+        del self.buffer[:]
+        self._data = []
+        self._data_size = 0
+
+    def feed(self, chunk):
+        """Add a chunk of bytes and return the data of the completed events."""
+        buffer = self.buffer
+        buffer += chunk
+        events = []
+        start = 0
+        while (end := buffer.find(b"\n", start)) >= 0:
+            if end > start and buffer[end - 1] == 13:  # strip the CR of CRLF
+                line = buffer[start : end - 1]
+            else:
+                line = buffer[start:end]
+            start = end + 1
+
+            if not line:
+                # An empty line dispatches the event
+                if self._data:
+                    events.append(
+                        self._data[0]
+                        if len(self._data) == 1
+                        else b"\n".join(self._data)
+                    )
+                    self._data = []
+                    self._data_size = 0
+            elif line.startswith(b"data:"):
+                # Lines starting with a colon are comments, only data fields are used
+                data = line[6:] if line[5:6] == b" " else line[5:]
+                self._data.append(data)
+                self._data_size += len(data)
+        del buffer[:start]
+
+        if len(buffer) + self._data_size > self.MAX_EVENT_SIZE:
+            _LOGGER.debug("Dropping oversized event of %s bytes", len(buffer))
+            self.malformed_frames += 1
+            self.reset()
+
+        return events
+
+
+STREAM_PHASES = (("ph-a", "l1"), ("ph-b", "l2"), ("ph-c", "l3"))
+STREAM_METERS = (
+    ("production", "production"),
+    ("total-consumption", "consumption"),
+    ("net-consumption", "net_consumption"),
+)
+
+
+class StreamHealth:
+    """Keeps track of the state, event rate and reconnects of the meter stream."""
+
+    RATE_INTERVAL = 10  # seconds
+
+    def __init__(self):
+        self.state = STREAM_STATE_DISCONNECTED
+        self.last_event = None
+        self.connected_at = None
+        self.events = 0
+        self.reconnects = 0
+        self.failures = 0  # connections in a row without any event
+        self._events_per_second = 0.0
+        self._rate_start = None
+        self._rate_events = 0
+
+    def connecting(self):
+        self.state = STREAM_STATE_CONNECTING
+
+    def connected(self):
+        self.state = STREAM_STATE_CONNECTED
+        self.connected_at = time.monotonic()
+        self.last_event = None
+        self._rate_start = self.connected_at
+        self._rate_events = 0
+
+    def event(self):
+        now = time.monotonic()
+        self.last_event = now
+        self.events += 1
+        self.failures = 0
+        self._rate_events += 1
+        if now - self._rate_start >= self.RATE_INTERVAL:
+            self._events_per_second = self._rate_events / (now - self._rate_start)
+            self._rate_start = now
+            self._rate_events = 0
+
+    def disconnected(self, stalled=False):
+        if self.last_event is None:
+            self.failures += 1
+        self.state = STREAM_STATE_STALLED if stalled else STREAM_STATE_DISCONNECTED
+        self.last_event = None
+
+    def seconds_without_event(self):
+        """Seconds since the last event (or since connecting)."""
+        return time.monotonic() - (self.last_event or self.connected_at)
+
+    @property
+    def is_healthy(self):
+        return (
+            self.state == STREAM_STATE_CONNECTED
+            and self.last_event is not None
+            and time.monotonic() - self.last_event < STREAM_STALL_TIMEOUT
+        )
+
+    @property
+    def events_per_second(self):
+        if not self.is_healthy:
+            return 0.0
+        return round(self._events_per_second, 2)
+
+    def reconnect_delay(self):
+        """Count a reconnect and return the delay before it (with jitter)."""
+        self.reconnects += 1
+        delay = min(
+            STREAM_RECONNECT_MIN_DELAY * 2**self.failures, STREAM_RECONNECT_MAX_DELAY
+        )
+        return random.uniform(delay / 2, delay)
+
+    def as_dict(self):
+        return {
+            "state": self.state,
+            "events": self.events,
+            "events_per_second": self.events_per_second,
+            "reconnects": self.reconnects,
+            "failures": self.failures,
+        }
+
+
+class StreamRecorder:
+    """Appends the raw chunks of the meter stream to a recording file.
+
+    Every recording session stores the time of a chunk relative to the start of
+    that session, so a file can hold several sessions after each other."""
+
+    def __init__(self, filename):
+        self.file = open(filename, "ab")
+        if self.file.tell() == 0:
+            self.file.write(STREAM_RECORDING_MAGIC)
+        self._start = time.monotonic()
+
+    def write(self, chunk):
+        self.file.write(
+            STREAM_RECORD_HEADER.pack(time.monotonic() - self._start, len(chunk))
+        )
+        self.file.write(chunk)
+
+    def close(self):
+        self.file.close()
+
+
+class StreamReplay:
+    """Replays a recording of StreamRecorder as the source of stream_reader.
+
+    The chunks are replayed with their recorded timing divided by speed, so 1 is
+    realtime and 10 is ten times faster. A speed of 0 replays without waiting."""
+
+    def __init__(self, filename, speed=1.0):
+        self.filename = filename
+        self.speed = speed
+
+    def records(self):
+        """Yield (seconds, chunk) for all records in the recording."""
+        with open(self.filename, "rb") as file:
+            if file.read(len(STREAM_RECORDING_MAGIC)) != STREAM_RECORDING_MAGIC:
+                raise EnvoyReaderError(f"{self.filename} is not a stream recording")
+
+            while header := file.read(STREAM_RECORD_HEADER.size):
+                if len(header) < STREAM_RECORD_HEADER.size:
+                    break  # Incomplete record at the end of the recording
+                seconds, length = STREAM_RECORD_HEADER.unpack(header)
+                chunk = file.read(length)
+                if len(chunk) < length:
+                    break
+                yield seconds, chunk
+
+    async def aiter_bytes(self):
+        session_seconds = previous_seconds = None
+        for seconds, chunk in self.records():
+            if session_seconds is None or seconds < previous_seconds:
+                # Start of a recording session
+                session_seconds, session_start = seconds, time.monotonic()
+            elif self.speed:
+                # Relative to the session start, so delays do not add up
+                delay = (
+                    session_start
+                    + (seconds - session_seconds) / self.speed
+                    - time.monotonic()
+                )
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)
+            previous_seconds = seconds
+            yield chunk
+
+
+class StreamSubscription:
+    """A subscriber of the meter stream, see EnvoyReader.subscribe_stream.
+
+    Events are StreamData objects (shared between subscribers, so do not modify
+    them) in a bounded queue. When the subscriber does not keep up, events are
+    dropped according to the policy instead of blocking the stream."""
+
+    def __init__(self, reader, maxsize=10, policy=STREAM_POLICY_DROP_OLDEST):
+        if policy == STREAM_POLICY_LATEST:
+            maxsize = 1
+        elif policy != STREAM_POLICY_DROP_OLDEST:
+            raise ValueError(f"Unknown stream subscription policy: {policy}")
+        elif maxsize < 1:
+            # asyncio.Queue(0) is unbounded, which would never drop events
+            raise ValueError(f"Stream subscription maxsize must be >= 1: {maxsize}")
+        self.reader = reader
+        self.policy = policy
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def put(self, stream_data):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(stream_data)
+
+    async def get(self):
+        """Wait for the next event."""
+        return await self.queue.get()
+
+    def close(self):
+        self.reader.unsubscribe_stream(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+
 class StreamData:
+    """A /stream/meter event.
+
+    The stream sends an event every second, so a StreamData (and its PhaseData)
+    is meant to be reused and updated in place with every event."""
+
+    __slots__ = ("production", "consumption", "net_consumption")
+
     class PhaseData:
+        __slots__ = ("watts", "amps", "volt_ampere", "volt", "pf", "hz", "var")
+
         def __init__(self, phase_data):
+            self.update(phase_data)
+
+        def update(self, phase_data):
             # https://en.wikipedia.org/wiki/AC_power explains the terms/units
             self.watts = phase_data["p"]  # wNow, active/real power, W
             self.amps = phase_data["i"]  # rmsCurrent, A
@@ -268,21 +877,26 @@ class StreamData:
                 self.var,
             )
 
-    def __init__(self, data):
+    def __init__(self, data=None):
         self.production = {}
         self.consumption = {}
         self.net_consumption = {}
-
-        phase_mapping = {"ph-a": "l1", "ph-b": "l2", "ph-c": "l3"}
-        for data_key, attr in {
-            "production": "production",
-            "total-consumption": "consumption",
-            "net-consumption": "net_consumption",
-        }.items():
-            for phase_key, phase in phase_mapping.items():
-                if not data.get(data_key, {}).get(phase_key, False):
-                    continue
-                getattr(self, attr)[phase] = self.PhaseData(data[data_key][phase_key])
+        if data is not None:
+            self.update(data)
+
+    def update(self, data):
+        """Update the phases in place with the data of a new event."""
+        for data_key, attr in STREAM_METERS:
+            meter_data = data.get(data_key) or {}
+            phases = getattr(self, attr)
+            for phase_key, phase in STREAM_PHASES:
+                phase_data = meter_data.get(phase_key)
+                if not phase_data:
+                    phases.pop(phase, None)
+                elif phase in phases:
+                    phases[phase].update(phase_data)
+                else:
+                    phases[phase] = self.PhaseData(phase_data)
 
     def __str__(self):
         return "<StreamData production=%s, consumption=%s, net_consumption=%s />" % (
@@ -292,6 +906,242 @@ class StreamData:
         )
 
 
+class WindowAggregate:
+    """Minimum, maximum and mean of the values of a metric within a window."""
+
+    __slots__ = ("minimum", "maximum", "total", "count")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.minimum = None
+        self.maximum = None
+        self.total = 0
+        self.count = 0
+
+    def add(self, value):
+        if value is None:
+            return
+        if not self.count:
+            self.minimum = self.maximum = value
+        elif value < self.minimum:
+            self.minimum = value
+        elif value > self.maximum:
+            self.maximum = value
+        self.total += value
+        self.count += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class StreamAggregator:
+    """Aggregates the values of the meter stream over fixed time windows.
+
+    Instead of publishing a single sample every window, the mean of all values
+    within the window is published, together with the minimum and maximum. Only
+    running totals are kept, so memory does not depend on the window length."""
+
+    def __init__(self, window):
+        self.window = window  # seconds
+        self.aggregates = {}
+        self._window_start = None
+
+    def add(self, key, value):
+        aggregate = self.aggregates.get(key)
+        if aggregate is None:
+            aggregate = self.aggregates[key] = WindowAggregate()
+        aggregate.add(value)
+
+    def window_finished(self):
+        """Return True if the window is over, the first window ends immediately."""
+        return (
+            self._window_start is None
+            or time.monotonic() - self._window_start >= self.window
+        )
+
+    def flush(self):
+        """Return {key: (mean, minimum, maximum)} and start a new window."""
+        self._window_start = time.monotonic()
+        result = {}
+        for key, aggregate in self.aggregates.items():
+            if aggregate.count:
+                result[key] = (aggregate.mean, aggregate.minimum, aggregate.maximum)
+            aggregate.reset()
+        return result
+
+
+class StreamEnergyIntegrator:
+    """Integrates the power of the meter stream into energy counters (Wh).
+
+    A counter is the last polled energy value plus the energy integrated from the
+    stream since then (trapezoidal rule). Gaps longer than MAX_GAP in the stream
+    are not integrated, and every new polled value becomes the new base. If the
+    stream counted more than the Envoy, the counter holds its value until the
+    polled value catches up, unless the polled value was reset (a new day)."""
+
+    MAX_GAP = 10  # seconds
+    SAVE_INTERVAL = 60  # seconds between saves of the counters while streaming
+
+    def __init__(self):
+        self.counters = {}
+        self.changed = False
+        self.saved_at = time.monotonic()
+        self._last_power = {}
+
+    def load(self, state):
+        """Restore the counters from the state as returned by state()."""
+        self.counters = {key: dict(counter) for key, counter in (state or {}).items()}
+
+    def state(self):
+        return {key: dict(counter) for key, counter in self.counters.items()}
+
+    def add(self, power_key, watts, energy_keys, now):
+        """Integrate a power value into the energy counters of energy_keys."""
+        last = self._last_power.get(power_key)
+        self._last_power[power_key] = (now, watts)
+        if last is None or last[1] is None or watts is None:
+            return
+
+        elapsed = now - last[0]
+        if not 0 < elapsed <= self.MAX_GAP:
+            return
+
+        # The energy counters of the Envoy only increase
+        energy = max(0, (last[1] + watts) / 2 * elapsed / 3600)
+        for key in energy_keys:
+            counter = self.counters.get(key)
+            if counter is not None and energy:
+                counter["delta"] += energy
+                self.changed = True
+
+    @property
+    def save_due(self):
+        """True if the counters changed and were not saved for SAVE_INTERVAL."""
+        return self.changed and time.monotonic() - self.saved_at >= self.SAVE_INTERVAL
+
+    def value(self, key):
+        counter = self.counters.get(key)
+        if counter is None:
+            return None
+        value = counter["polled"] + counter["delta"]
+        if counter["floor"] is not None and value < counter["floor"]:
+            return counter["floor"]
+        return value
+
+    def reconcile(self, key, polled):
+        """Use a polled energy value as new base and return the counter value."""
+        if polled is None:
+            return self.value(key)
+
+        counter = self.counters.get(key)
+        if counter is None or polled != counter["polled"]:
+            floor = None
+            if counter is not None and polled >= counter["polled"]:
+                floor = self.value(key)
+            self.counters[key] = {"polled": polled, "delta": 0, "floor": floor}
+            self.changed = True
+
+        return self.value(key)
+
+
+class RollingHistogram:
+    """Histogram of the last SIZE samples, with buckets by upper bound."""
+
+    SIZE = 100
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.samples = deque(maxlen=self.SIZE)
+
+    def add(self, value):
+        self.samples.append(value)
+
+    def as_dict(self):
+        if not self.samples:
+            return {"count": 0}
+
+        samples = sorted(self.samples)
+        counts = dict.fromkeys([*self.buckets, "inf"], 0)
+        for value in samples:
+            bucket = next((b for b in self.buckets if value <= b), "inf")
+            counts[bucket] += 1
+
+        return {
+            "count": len(samples),
+            "min": samples[0],
+            "max": samples[-1],
+            "mean": sum(samples) / len(samples),
+            "p50": samples[len(samples) // 2],
+            "p95": samples[min(int(len(samples) * 0.95), len(samples) - 1)],
+            "buckets": counts,
+        }
+
+
+class EndpointStats:
+    """Instrumentation of the requests to, and parsing of, one endpoint.
+
+    A cache hit is an update that did not need parsing: the endpoint was not due
+    yet, the Envoy answered 304 Not Modified, or the body was unchanged."""
+
+    LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+    SIZE_BUCKETS = (1024, 10240, 102400, 1048576)  # bytes
+    PARSE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)  # seconds
+
+    def __init__(self):
+        self.latency = RollingHistogram(self.LATENCY_BUCKETS)
+        self.response_bytes = RollingHistogram(self.SIZE_BUCKETS)
+        self.parse_time = RollingHistogram(self.PARSE_BUCKETS)
+        self.counters = {
+            "requests": 0,
+            "errors": 0,
+            "not_due": 0,
+            "not_modified": 0,
+            "unchanged": 0,
+            "parsed": 0,
+        }
+        self.cycle_time = 0  # request and parse time in the current update
+
+    def request(self, seconds, response):
+        """Count a finished request, response is None if it raised."""
+        self.counters["requests"] += 1
+        self.latency.add(seconds)
+        self.cycle_time += seconds
+        if response is None or response.status_code not in (200, 304):
+            self.counters["errors"] += 1
+        elif response.status_code == 304:
+            self.counters["not_modified"] += 1
+        else:
+            self.response_bytes.add(len(response.content))
+
+    def parsed(self, seconds):
+        self.counters["parsed"] += 1
+        self.parse_time.add(seconds)
+        self.cycle_time += seconds
+
+    @property
+    def cache_hits(self):
+        return sum(
+            self.counters[counter]
+            for counter in ("not_due", "not_modified", "unchanged")
+        )
+
+    def as_dict(self):
+        hits, misses = self.cache_hits, self.counters["parsed"]
+        return {
+            **self.counters,
+            "cache_hits": hits,
+            "cache_misses": misses,
+            "cache_hit_ratio": hits / (hits + misses) if hits + misses else None,
+            "latency": self.latency.as_dict(),
+            "response_bytes": self.response_bytes.as_dict(),
+            "parse_time": self.parse_time.as_dict(),
+            "last_cycle_time": self.cycle_time,
+        }
+
+
 def _async_get_property(key):
     async def get(self):
         return self.data.get(key)
@@ -299,12 +1149,23 @@ def _async_get_property(key):
     return get
 
 
+class EnvoyProperty(property):
+    """Property that is part of EnvoyData.all_values, see envoy_property."""
+
+    required_endpoint = None
+
+
+class TokenPath(property):
+    """Property returning a jsonpath based on the token type, see path_by_token."""
+
+
 def envoy_property(*a, **kw):
     endpoint = kw.pop("required_endpoint", None)
 
     def prop(f):
-        EnvoyData._envoy_properties[f.__name__] = endpoint
-        return property(f)
+        envoy_prop = EnvoyProperty(f)
+        envoy_prop.required_endpoint = endpoint
+        return envoy_prop
 
     if endpoint != None or len(a) == 0:
         return prop
@@ -321,38 +1182,108 @@ def path_by_token(owner, installer=None):
             return installer
         return owner
 
-    return property(path)
+    return TokenPath(path)
+
+
+# Kinds of attributes in the EnvoyData attribute registry
+ATTR_PATH = "path"
+ATTR_TOKEN_PATH = "token_path"
+ATTR_PROPERTY = "property"
 
 
 class EnvoyData(object):
     """Functions in this class will provide getters and setters for data to be provided"""
 
-    _envoy_properties = {}
-
     def __new__(cls, *a, **kw):
-        cls._attributes = []
+        # Subclasses add their dynamic _value attributes before calling this
+        # method, so the registry is built on the first instance of each class.
+        if "_registry" not in cls.__dict__:
+            cls._registry = cls._build_registry()
+
+        return object.__new__(cls)
+
+    @classmethod
+    def _build_registry(cls):
+        """Map every attribute name to its kind and its source endpoint(s).
+
+        A _value attribute takes precedence over a property with the same name."""
+        registry = {}
         for attr in dir(cls):
+            value = getattr(cls, attr)
             if attr.endswith("_value"):
-                cls._attributes.append(attr[:-6])
-
-            elif isinstance(getattr(cls, attr), property):
-                if attr in cls._envoy_properties:
-                    cls._attributes.append(attr)
+                if isinstance(value, str):
+                    registry[attr[:-6]] = {
+                        "kind": ATTR_PATH,
+                        "attr": attr,
+                        "endpoints": [value.split(".", 1)[0]],
+                    }
+                else:
+                    # The endpoint depends on the token, so it is resolved on use
+                    registry[attr[:-6]] = {
+                        "kind": ATTR_TOKEN_PATH,
+                        "attr": attr,
+                        "endpoints": None,
+                    }
+
+            elif isinstance(value, EnvoyProperty):
+                endpoints = value.required_endpoint
+                if endpoints is not None and not isinstance(endpoints, list):
+                    endpoints = [endpoints]
+                registry.setdefault(
+                    attr,
+                    {"kind": ATTR_PROPERTY, "attr": attr, "endpoints": endpoints},
+                )
 
-        return object.__new__(cls)
+        return registry
 
     def __init__(self, reader):
         self.reader = reader
         self.data = {}
         self.initial_update_finished = False
         self._required_endpoints = None
+
+        # Change tracking, used to only recompute attributes with changed inputs
+        self._responses = {}  # last applied response per endpoint
+        self._content_hashes = {}  # hash of the last parsed body per endpoint
+        self._generations = {}  # endpoint -> number of times its data changed
+        self._values = {}  # attribute -> (value, {endpoint: generation})
+        self._values_context = None
+        self._dependencies = None  # endpoints read while computing an attribute
         super(object, self).__init__()
 
     def set_endpoint_data(self, endpoint, response):
-        """Called by EnvoyReader.update_endpoints when a response is successfull"""
+        """Called by EnvoyReader.update_endpoints when a response is successfull
+
+        Returns True if the endpoint data changed, False if it did not change and
+        None if the response was not usable."""
+        if response is None:
+            return None
+
+        if response.status_code == 304:
+            # Not modified, the previously parsed data is still valid
+            return False
+
         if response.status_code != 200:
             # It is a server error, do not store endpoint_data
-            return
+            return None
+
+        if response is self._responses.get(endpoint):
+            # A cached response that has been applied already, nothing changed
+            return False
+
+        self._responses[endpoint] = response
+        stats = self.reader.endpoint_stats(endpoint)
+        start = time.perf_counter()
+
+        content_hash = hashlib.blake2b(response.content, digest_size=16).digest()
+        if endpoint in self.data and content_hash == self._content_hashes.get(endpoint):
+            # Same body as last time, keep the previously parsed data
+            stats.counters["unchanged"] += 1
+            _LOGGER.debug("Endpoint '%s' data unchanged", endpoint)
+            return False
+
+        self._content_hashes[endpoint] = content_hash
+        self._generations[endpoint] = self._generations.get(endpoint, 0) + 1
 
         content_type = response.headers.get("content-type", "application/json")
         path = response.url.path
@@ -369,11 +1300,32 @@ class EnvoyData(object):
             self.data[endpoint] = response.text
 
         if endpoint in ["endpoint_meters", "endpoint_meters_readings"]:
+            # Always merge the meters into the readings, as a new readings response
+            # replaces the earlier merged data.
             self.data["endpoint_meters_readings"] = merge_metersdata(
-                self.data.get("endpoint_meters_readings", []), self.data[endpoint]
+                self.data.get("endpoint_meters_readings", []),
+                self.data.get("endpoint_meters", []),
             )
+            if endpoint == "endpoint_meters":
+                self._generations["endpoint_meters_readings"] = (
+                    self._generations.get("endpoint_meters_readings", 0) + 1
+                )
 
+        stats.parsed(time.perf_counter() - start)
         _LOGGER.debug("Endpoint '%s' data: %s", endpoint, self.data[endpoint])
+        return True
+
+    def invalidate(self, endpoint):
+        """Forget the last response of an endpoint and the values computed from it,
+        so the next response is parsed even when its body did not change."""
+        self._responses.pop(endpoint, None)
+        self._content_hashes.pop(endpoint, None)
+        self._generations[endpoint] = self._generations.get(endpoint, 0) + 1
+        self._values = {
+            attr: cached
+            for attr, cached in self._values.items()
+            if endpoint not in cached[1]
+        }
 
     @property
     def required_endpoints(self):
@@ -384,35 +1336,33 @@ class EnvoyData(object):
         endpoints = []
         endpoints.append(self.reader.device_data_endpoint)
 
-        # Loop through all local attributes, and return unique first required jsonpath attribute.
-        for attr in dir(self):
-            if attr.endswith("_value") and isinstance(
-                (path := getattr(self, attr)), (str)
-            ):
-                if self.initial_update_finished:
-                    # Check if the path resolves, if not, do not include endpoint.
-                    if self._resolve_path(path) is None:
-                        # If the resolved path is None, we skip this path for the endpoints
-                        continue
-
-                endpoints.append(path.split(".", 1)[0])
-                continue  # discovered, so continue
+        # Loop through all registered attributes, and return unique first required jsonpath attribute.
+        for name, attribute in self._registry.items():
+            if attribute["kind"] == ATTR_PROPERTY:
+                if not attribute["endpoints"]:
+                    continue
 
-            if attr in self._envoy_properties and isinstance(
-                self._envoy_properties[attr], (str, list)
-            ):
-                value = getattr(self, attr)
+                value = getattr(self, name)
                 if self.initial_update_finished and value in (None, [], {}):
                     # When the value is None or empty list or dict,
                     # then the endpoint is useless for this token,
                     # so do not require it.
                     continue
 
-                attr_values = self._envoy_properties[attr]
-                if not isinstance(attr_values, list):
-                    attr_values = [attr_values]
+                endpoints.extend(attribute["endpoints"])
+                continue
+
+            path = getattr(self, attribute["attr"])
+            if not isinstance(path, str):
+                continue
 
-                endpoints.extend(attr_values)
+            if self.initial_update_finished:
+                # Check if the path resolves, if not, do not include endpoint.
+                if self._resolve_path(path) is None:
+                    # If the resolved path is None, we skip this path for the endpoints
+                    continue
+
+            endpoints.append(path.split(".", 1)[0])
 
         endpoints = set(endpoints)
 
@@ -425,17 +1375,49 @@ class EnvoyData(object):
 
     @property
     def all_values(self):
-        """A special property attribute, that will return all dynamic fields."""
+        """A special property attribute, that will return all dynamic fields.
+
+        Values are only recomputed when the data of an endpoint they were
+        resolved from has changed since the previous call."""
+        context = (self.reader.token_type, self.reader.disable_installer_account_use)
+        if context != self._values_context:
+            # Token dependent paths may resolve differently, recompute everything.
+            self._values = {}
+            self._values_context = context
+
         result = {}
-        for attr in self._attributes:
-            result[attr] = self.get(attr)
+        for attr in self._registry:
+            if (cached := self._values.get(attr)) is not None:
+                value, generations = cached
+                if all(
+                    self._generations.get(endpoint, 0) == generation
+                    for endpoint, generation in generations.items()
+                ):
+                    result[attr] = value
+                    continue
+
+            self._dependencies = set()
+            try:
+                result[attr] = self.get(attr)
+            finally:
+                dependencies, self._dependencies = self._dependencies, None
+
+            self._values[attr] = (
+                result[attr],
+                {
+                    endpoint: self._generations.get(endpoint, 0)
+                    for endpoint in dependencies
+                },
+            )
 
         return result
 
     def _resolve_path(self, path, default=None):
         _LOGGER.debug("Resolving jsonpath %s", path)
+        if self._dependencies is not None:
+            self._dependencies.add(re.split(r"[.\[]", path, 1)[0])
 
-        result = jsonpath(self.data, path)
+        result = compile_jsonpath(path)(self.data)
         if result == False:
             _LOGGER.debug("the configured path %s did not return anything!", path)
             return default
@@ -462,15 +1444,15 @@ class EnvoyData(object):
 
     def get(self, name):
         result = None
-        if (attr := f"{name}_value") in dir(self):
-            path = getattr(self, attr)
-            result = self._resolve_path(path)
-        elif name in self._envoy_properties:
+        attribute = self._registry.get(name)
+        if attribute is None:
+            _LOGGER.debug("Attribute %s unknown", name)
+        elif attribute["kind"] == ATTR_PROPERTY:
             result = getattr(self, name)
         else:
-            _LOGGER.debug("Attribute %s unknown", name)
+            result = self._resolve_path(getattr(self, attribute["attr"]))
 
-        _LOGGER.debug(f"EnvoyData.get({name}) -> {result}")
+        _LOGGER.debug("EnvoyData.get(%s) -> %s", name, result)
         return result
 
 
@@ -553,15 +1535,11 @@ class EnvoyStandard(EnvoyData):
 
     @envoy_property()
     def inverter_device_data(self):
-        return self._path_to_dict(
-            f"{self.reader.device_data_endpoint}.[?(@.type=='pcu')]", "sn"
-        )
+        return self._resolve_path(f"{self.reader.device_data_endpoint}.pcu")
 
     @envoy_property()
     def relay_device_data(self):
-        return self._path_to_dict(
-            f"{self.reader.device_data_endpoint}.[?(@.type=='nsrb')]", "sn"
-        )
+        return self._resolve_path(f"{self.reader.device_data_endpoint}.nsrb")
 
     @envoy_property(required_endpoint="endpoint_ensemble_inventory")
     def batteries(self):
@@ -768,6 +1746,11 @@ class EnvoyReader:
         disabled_endpoints=[],
         lifetime_production_correction=0,
         device_data_endpoint="endpoint_device_data",
+        max_parallel_requests=1,
+        adaptive_polling=False,
+        adaptive_polling_min_interval=0,
+        adaptive_polling_max_interval=900,
+        stream_reduces_polling=False,
     ):
         """Init the EnvoyReader."""
         self.host = host.lower()
@@ -779,8 +1762,19 @@ class EnvoyReader:
         self.fetch_task = None
 
         self._async_client = async_client
+        self._owns_async_client = async_client is None
+        self._closed = False
         self._authorization_header = None
         self._cookies = None
+        self._auth_lock = asyncio.Lock()
+        self._session_validated_at = None
+        self._revalidate_task = None
+        # The Envoy is an embedded device, so limit the number of requests
+        # that are done at the same time.
+        self._request_semaphore = asyncio.Semaphore(max_parallel_requests)
+        # Requests that are running, so concurrent callers can share them
+        self._inflight = {}
+        self._endpoint_stats = {}  # endpoint -> EndpointStats
         self.enlighten_user = enlighten_user
         self.enlighten_pass = enlighten_pass
         self.commissioned = commissioned
@@ -794,6 +1788,11 @@ class EnvoyReader:
         self.lifetime_production_correction = lifetime_production_correction
         self.device_data_endpoint = device_data_endpoint
 
+        # Stretch the poll interval of endpoints whose content rarely changes
+        self.adaptive_polling = adaptive_polling
+        self.adaptive_polling_min_interval = adaptive_polling_min_interval
+        self.adaptive_polling_max_interval = adaptive_polling_max_interval
+
         self.uri_registry = {}
         for key, endpoint in ENVOY_ENDPOINTS.items():
             self.register_url(f"endpoint_{key}", **endpoint)
@@ -809,20 +1808,43 @@ class EnvoyReader:
         self.disable_installer_account_use = False
 
         self.is_receiving_realtime_data = False
+        self._stream_parser = SSEFrameParser()
+        self.stream_health = StreamHealth()
+        self._stream_subscriptions = []
+        # Record the stream to a StreamRecorder, or read it from a StreamReplay
+        self.stream_recorder = None
+        self.stream_replay = None
+        self.stream_energy = StreamEnergyIntegrator()
+        # Poll endpoints with a stream_cache less often while the stream is healthy.
+        # Only endpoints whose values all come from the stream can have one.
+        self.stream_reduces_polling = stream_reduces_polling
 
         self._store = store
         self._store_data = {}
         self._store_update_pending = False
 
     def register_url(
-        self, attr, url, cache=10, installer_required=False, optional=False
+        self,
+        attr,
+        url,
+        cache=10,
+        installer_required=False,
+        optional=False,
+        stream_cache=None,
     ):
         self.uri_registry[attr] = {
             "url": url,
             "cache_time": cache,
+            "stream_cache_time": stream_cache,
             "last_fetch": 0,
             "installer_required": installer_required,
             "optional": optional,
+            # Validators of the last successful response, for conditional requests
+            "etag": None,
+            "last_modified": None,
+            # Learned by the adaptive polling, starts at the static cache time
+            "poll_interval": cache,
+            "last_change": None,
         }
         setattr(self, attr, None)
         return self.uri_registry[attr]
@@ -833,6 +1855,101 @@ class EnvoyReader:
 
         # Setting last_fetch to 0 ensures it will be fetched upon next run
         self.uri_registry[attr]["last_fetch"] = 0
+        # and parse the response, also when its body did not change
+        self.data.invalidate(attr)
+        # Drop the validators, so the Envoy cannot answer 304 Not Modified
+        self.uri_registry[attr]["etag"] = None
+        self.uri_registry[attr]["last_modified"] = None
+        # Something is expected to change, so poll it at the base rate again
+        self.uri_registry[attr]["poll_interval"] = self.uri_registry[attr]["cache_time"]
+        self.uri_registry[attr]["last_change"] = None
+
+    def _adapt_poll_interval(self, attr, changed):
+        """Learn how often the content of an endpoint changes.
+
+        The poll interval is a fraction of the time the content has been unchanged,
+        limited by the adaptive polling min and max interval. It never gets lower
+        than the cache time of the endpoint. As soon as a change is detected the
+        interval drops back to its minimum."""
+        endpoint_settings = self.uri_registry[attr]
+        now = endpoint_settings["last_fetch"]
+        if changed or endpoint_settings["last_change"] is None:
+            endpoint_settings["last_change"] = now
+
+        unchanged_for = now - endpoint_settings["last_change"]
+        interval = min(
+            max(
+                unchanged_for * ADAPTIVE_POLLING_FACTOR,
+                self.adaptive_polling_min_interval,
+            ),
+            self.adaptive_polling_max_interval,
+        )
+        interval = max(interval, endpoint_settings["cache_time"])
+        if interval != endpoint_settings["poll_interval"]:
+            _LOGGER.debug(
+                "Poll interval of %s changed from %ss to %ss (unchanged for %ds)",
+                attr,
+                endpoint_settings["poll_interval"],
+                interval,
+                unchanged_for,
+            )
+        endpoint_settings["poll_interval"] = interval
+
+    def endpoint_stats(self, endpoint):
+        """Return the EndpointStats of an endpoint."""
+        stats = self._endpoint_stats.get(endpoint)
+        if stats is None:
+            stats = self._endpoint_stats[endpoint] = EndpointStats()
+        return stats
+
+    @property
+    def endpoint_instrumentation(self):
+        """Request and parse statistics per endpoint, the slowest first."""
+        return {
+            endpoint: stats.as_dict()
+            for endpoint, stats in sorted(
+                self._endpoint_stats.items(),
+                key=lambda item: item[1].latency.as_dict().get("mean", 0)
+                + item[1].parse_time.as_dict().get("mean", 0),
+                reverse=True,
+            )
+        }
+
+    @property
+    def cycle_time(self):
+        """Request and parse time of all endpoints in the last get_data()."""
+        return sum(stats.cycle_time for stats in self._endpoint_stats.values())
+
+    @property
+    def slowest_endpoint(self):
+        """The endpoint that took the most time in the last get_data()."""
+        endpoint, stats = max(
+            self._endpoint_stats.items(),
+            key=lambda item: item[1].cycle_time,
+            default=(None, None),
+        )
+        if stats is not None and stats.cycle_time > 0:
+            return endpoint
+
+    def subscribe_stream(self, maxsize=10, policy=STREAM_POLICY_DROP_OLDEST):
+        """Return a new subscription that receives the events of stream_reader."""
+        subscription = StreamSubscription(self, maxsize, policy)
+        self._stream_subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe_stream(self, subscription):
+        if subscription in self._stream_subscriptions:
+            self._stream_subscriptions.remove(subscription)
+
+    @property
+    def is_stream_healthy(self):
+        """True if the meter stream is connected and recently sent an event."""
+        return self.is_receiving_realtime_data and self.stream_health.is_healthy
+
+    @property
+    def stream_malformed_frames(self):
+        """Number of /stream/meter events that could not be decoded."""
+        return self._stream_parser.malformed_frames
 
     @property
     def _token(self):
@@ -843,33 +1960,137 @@ class EnvoyReader:
         self._store_data["token"] = token_value
         self._store_update_pending = True
 
-    async def _sync_store(self, load=False):
+    async def _sync_store(self, load=False, force=False):
+        """Load or save the store. The energy counters change with every poll and
+        stream event, so they are saved at most every SAVE_INTERVAL, unless forced
+        (on stop and unload)."""
         if (self._store and not self._store_data) or load:
             self._store_data = await self._store.async_load() or {}
+            self.stream_energy.load(self._store_data.get("stream_energy"))
+
+        if self.stream_energy.changed and (force or self.stream_energy.save_due):
+            self.stream_energy.changed = False
+            self.stream_energy.saved_at = time.monotonic()
+            self._store_data["stream_energy"] = self.stream_energy.state()
+            self._store_update_pending = True
 
         if self._store and self._store_update_pending:
             self._store_update_pending = False
             await self._store.async_save(self._store_data)
 
+    @staticmethod
+    def _create_async_client():
+        return httpx.AsyncClient(verify=False, limits=HTTPX_LIMITS)
+
+    async def open(self):
+        """Create the pooled httpx client, if the reader owns it."""
+        if self._owns_async_client and (
+            self._async_client is None or self._async_client.is_closed
+        ):
+            # Creating the client builds an SSLContext, which is blocking.
+            loop = asyncio.get_running_loop()
+            self._async_client = await loop.run_in_executor(
+                None, self._create_async_client
+            )
+        self._closed = False
+
+    async def aclose(self):
+        """Close the pooled httpx client, if the reader owns it."""
+        if self._revalidate_task and not self._revalidate_task.done():
+            self._revalidate_task.cancel()
+
+        self._closed = True
+        if self._owns_async_client and self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
     @property
     def async_client(self):
-        """Return the httpx client."""
-        return self._async_client or httpx.AsyncClient(verify=False)
+        """Return the httpx client, which is kept open between requests.
+
+        Without open(), the reader creates its client on first use. A request after
+        aclose() raises an EnvoyReaderError, so no client is left open."""
+        if self._closed or (
+            self._async_client is not None and self._async_client.is_closed
+        ):
+            raise EnvoyReaderError("The EnvoyReader (or its httpx client) is closed")
+        if self._async_client is None:
+            self._async_client = self._create_async_client()
+        return self._async_client
 
     async def _update_endpoint(self, attr, url, only_on_success=False):
         """Update a property from an endpoint."""
         if url.startswith("https://"):
             formatted_url = url.format(self.host)
+            endpoint_settings = self.uri_registry.get(attr, {})
+
+            # Only ask for changes when we still have the previous response
+            headers = {}
+            previous = getattr(self, attr, None)
+            if previous is not None and previous.status_code == 200:
+                if endpoint_settings.get("etag"):
+                    headers["If-None-Match"] = endpoint_settings["etag"]
+                if endpoint_settings.get("last_modified"):
+                    headers["If-Modified-Since"] = endpoint_settings["last_modified"]
+
             response = await self._async_fetch_with_retry(
-                formatted_url, follow_redirects=False
+                formatted_url, headers=headers, follow_redirects=False
             )
+            if response.status_code == 304:
+                # Not modified, keep the previous response (and its parsed data)
+                _LOGGER.debug("Endpoint %s not modified", attr)
+                return response
+
+            if response.status_code == 200 and endpoint_settings:
+                endpoint_settings["etag"] = response.headers.get("etag")
+                endpoint_settings["last_modified"] = response.headers.get(
+                    "last-modified"
+                )
+
             if not only_on_success or response.status_code == 200:
                 setattr(self, attr, response)
+            return response
         else:
             data = FileData(url)
             setattr(self, attr, data)
+            return data
+
+    async def _single_flight(self, key, request):
+        """Run request(), or join the request with the same key that is running.
+
+        Concurrent callers share the result (or the exception) of one request. The
+        shared request is shielded, so a caller that is cancelled does not cancel
+        it for the other callers."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(request())
+            self._inflight[key] = task
+
+            def _request_done(task):
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+                if not task.cancelled():
+                    # Mark the exception as retrieved, the callers handle it
+                    task.exception()
+
+            task.add_done_callback(_request_done)
+        else:
+            _LOGGER.debug("Joining in-flight request %s", key)
+
+        return await asyncio.shield(task)
 
-    async def _async_fetch_with_retry(self, url, **kwargs):
+    async def _async_fetch_with_retry(self, url, headers=None, **kwargs):
+        """Fetch the url, sharing the request with concurrent callers of the same url."""
+        key = (
+            url,
+            tuple(sorted((headers or {}).items())),
+            tuple(sorted(kwargs.items())),
+        )
+        return await self._single_flight(
+            key, partial(self._async_fetch_retrying, url, headers, **kwargs)
+        )
+
+    async def _async_fetch_retrying(self, url, headers=None, **kwargs):
         """Retry 3 times to fetch the url if there is a transport error."""
         received_401 = 0
         for attempt in range(3):
@@ -880,16 +2101,26 @@ class EnvoyReader:
                 self._authorization_header,
                 self._cookies,
             )
+            authorization_header, cookies = self._authorization_header, self._cookies
             try:
-                async with self.async_client as client:
-                    resp = await client.get(
-                        url,
-                        headers=self._authorization_header,
-                        cookies=self._cookies,
-                        timeout=30,
-                        **kwargs,
-                    )
-                    if resp.status_code == 401 and attempt < 2:
+                client = self.async_client
+                resp = await client.get(
+                    url,
+                    headers={**(authorization_header or {}), **(headers or {})},
+                    cookies=cookies,
+                    timeout=30,
+                    **kwargs,
+                )
+                if resp.status_code == 401 and attempt < 2:
+                    async with self._auth_lock:
+                        if (
+                            self._authorization_header is not authorization_header
+                            or self._cookies is not cookies
+                        ):
+                            # Another request refreshed the token in the meantime
+                            _LOGGER.debug("Received 401 from Envoy; token refreshed")
+                            continue
+
                         _LOGGER.debug(
                             "Received 401 from Envoy; refreshing token, attempt %s of 2",
                             attempt + 1,
@@ -904,10 +2135,10 @@ class EnvoyReader:
                         if not could_refresh_cookies:
                             await self._get_enphase_token()
 
-                        received_401 += 1
-                        continue
-                    _LOGGER.debug("Fetched from %s: %s: %s", url, resp, resp.text)
-                    return resp
+                    received_401 += 1
+                    continue
+                _LOGGER.debug("Fetched from %s: %s: %s", url, resp, resp.text)
+                return resp
             except httpx.TransportError as e:
                 _LOGGER.debug("TransportError: %s", e)
                 if attempt == 2:
@@ -917,18 +2148,18 @@ class EnvoyReader:
         _LOGGER.debug("HTTP POST Attempt: %s", url)
         _LOGGER.debug("HTTP POST Data: %s", data)
         try:
-            async with self.async_client as client:
-                resp = await client.post(
-                    url,
-                    headers=self._authorization_header,
-                    cookies=self._cookies,
-                    data=data,
-                    timeout=30,
-                    **kwargs,
-                )
-                _LOGGER.debug("HTTP POST %s: %s: %s", url, resp, resp.text)
-                _LOGGER.debug("HTTP POST Cookie: %s", resp.cookies)
-                return resp
+            client = self.async_client
+            resp = await client.post(
+                url,
+                headers=self._authorization_header,
+                cookies=self._cookies,
+                data=data,
+                timeout=30,
+                **kwargs,
+            )
+            _LOGGER.debug("HTTP POST %s: %s: %s", url, resp, resp.text)
+            _LOGGER.debug("HTTP POST Cookie: %s", resp.cookies)
+            return resp
         except httpx.TransportError as e:
             _LOGGER.debug("TransportError: %s", e)
             raise e
@@ -939,17 +2170,17 @@ class EnvoyReader:
         )
         _LOGGER.debug("HTTP PUT Data: %s", data)
         try:
-            async with self.async_client as client:
-                resp = await client.put(
-                    url,
-                    headers=self._authorization_header,
-                    cookies=self._cookies,
-                    json=data,
-                    timeout=30,
-                    **kwargs,
-                )
-                _LOGGER.debug("HTTP PUT %s: %s: %s", url, resp, resp.text)
-                return resp
+            client = self.async_client
+            resp = await client.put(
+                url,
+                headers=self._authorization_header,
+                cookies=self._cookies,
+                json=data,
+                timeout=30,
+                **kwargs,
+            )
+            _LOGGER.debug("HTTP PUT %s: %s: %s", url, resp, resp.text)
+            return resp
         except httpx.TransportError as e:
             _LOGGER.debug("TransportError: %s", e)
             raise e
@@ -961,66 +2192,66 @@ class EnvoyReader:
         :returns received access_token
         """
         _LOGGER.debug("Fetching envoy token")
-        async with self.async_client as client:
-            # Step 1, generate local secret
-            code_verifier = random_content(40)
-
-            _LOGGER.debug("Local auth secret: %s", code_verifier)
-
-            # Step 2, call the entrez login with form fields
-            # all params are reverse engineered, so prone to changes
-            login_data = dict(
-                username=self.enlighten_user,
-                password=self.enlighten_pass,
-                codeChallenge=generate_challenge(code_verifier),
-                redirectUri=f"https://{self.host}/auth/callback",
-                client="envoy-ui",
-                clientId="envoy-ui-client",
-                authFlow="oauth",
-                serialNum=self.enlighten_serial_num,
-                granttype="authorize",
-                state="",
-                invalidSerialNum="",
-            )
-            _LOGGER.debug(
-                "Doing authorize at entrez, with codeChallenge: %s",
-                login_data["codeChallenge"],
-            )
-            resp = await client.post(ENLIGHTEN_LOGIN_URL, data=login_data)
-
-            if resp.status_code >= 400:
-                raise EnlightenError("Could not Login via Enlighten")
-
-            # we should expect a 302 redirect
-            if resp.status_code != 302:
-                raise EnlightenError("Login did not succeed")
-
-            # Step 3: Fetch the code from the query params.
-            redirect_location = resp.headers.get("location")
-            url_parts = parse.urlparse(redirect_location)
-            query_parts = parse.parse_qs(url_parts.query)
-
-            # Step 4: Fetch the JWT token through envoy
-            json_data = {
-                "client_id": "envoy-ui-1",
-                "code": query_parts["code"][0],
-                "code_verifier": code_verifier,
-                "grant_type": "authorization_code",
-                "redirect_uri": login_data["redirectUri"],
-            }
-            _LOGGER.debug("Checking JWT on envoy with params %s", json_data)
-            resp = await client.post(
-                ENDPOINT_URL_GET_JWT.format(self.host),
-                json=json_data,
-                timeout=30,
-            )
+        client = self.async_client
+        # Step 1, generate local secret
+        code_verifier = random_content(40)
+
+        _LOGGER.debug("Local auth secret: %s", code_verifier)
+
+        # Step 2, call the entrez login with form fields
+        # all params are reverse engineered, so prone to changes
+        login_data = dict(
+            username=self.enlighten_user,
+            password=self.enlighten_pass,
+            codeChallenge=generate_challenge(code_verifier),
+            redirectUri=f"https://{self.host}/auth/callback",
+            client="envoy-ui",
+            clientId="envoy-ui-client",
+            authFlow="oauth",
+            serialNum=self.enlighten_serial_num,
+            granttype="authorize",
+            state="",
+            invalidSerialNum="",
+        )
+        _LOGGER.debug(
+            "Doing authorize at entrez, with codeChallenge: %s",
+            login_data["codeChallenge"],
+        )
+        resp = await client.post(ENLIGHTEN_LOGIN_URL, data=login_data)
+
+        if resp.status_code >= 400:
+            raise EnlightenError("Could not Login via Enlighten")
+
+        # we should expect a 302 redirect
+        if resp.status_code != 302:
+            raise EnlightenError("Login did not succeed")
+
+        # Step 3: Fetch the code from the query params.
+        redirect_location = resp.headers.get("location")
+        url_parts = parse.urlparse(redirect_location)
+        query_parts = parse.parse_qs(url_parts.query)
+
+        # Step 4: Fetch the JWT token through envoy
+        json_data = {
+            "client_id": "envoy-ui-1",
+            "code": query_parts["code"][0],
+            "code_verifier": code_verifier,
+            "grant_type": "authorization_code",
+            "redirect_uri": login_data["redirectUri"],
+        }
+        _LOGGER.debug("Checking JWT on envoy with params %s", json_data)
+        resp = await client.post(
+            ENDPOINT_URL_GET_JWT.format(self.host),
+            json=json_data,
+            timeout=30,
+        )
 
-            if resp.status_code != 200:
-                raise EnvoyError(
-                    f"Could not fetch access token from envoy; HTTP {resp.status_code}: {resp.text}"
-                )
+        if resp.status_code != 200:
+            raise EnvoyError(
+                f"Could not fetch access token from envoy; HTTP {resp.status_code}: {resp.text}"
+            )
 
-            return resp.json()["access_token"]
+        return resp.json()["access_token"]
 
     async def _get_enphase_token(self):
         self._token = await self._fetch_envoy_token_json()
@@ -1060,6 +2291,7 @@ class EnvoyReader:
         if token_validation.status_code == 200:
             # set the cookies for future clients
             self._cookies = token_validation.cookies
+            self._session_validated_at = time.monotonic()
 
             # search for all cookies with session in the name (sessionId, session_id, etc)
             session_cookies = [k for k in self._cookies if "session" in k.lower()]
@@ -1074,6 +2306,7 @@ class EnvoyReader:
             return True
 
         # token not valid if we get here
+        self._session_validated_at = None
         return False
 
     def _is_enphase_token_expired(self, token):
@@ -1096,7 +2329,13 @@ class EnvoyReader:
             _LOGGER.debug("Token expired on: %s", exp_time)
             return True
 
-    async def init_authentication(self):
+    async def init_authentication(self, revalidate=False):
+        """Make sure there is a valid token and session.
+
+        A session that has been validated is reused, without contacting the Envoy,
+        until a request receives a 401 or the token expires. Once the session gets
+        older than SESSION_REVALIDATE_INTERVAL, it is re-validated in the background.
+        """
         _LOGGER.debug("Checking Token value: %s", self._token)
         # Check if a token has already been retrieved
         if self._token == "":
@@ -1107,12 +2346,40 @@ class EnvoyReader:
             if self._is_enphase_token_expired(self._token):
                 _LOGGER.debug("Found Expired token - Retrieving new token")
                 await self._get_enphase_token()
-            else:
+            elif revalidate or self._session_validated_at is None:
                 await self._refresh_token_cookies()
+            elif (
+                time.monotonic() - self._session_validated_at
+                > SESSION_REVALIDATE_INTERVAL
+            ):
+                self._schedule_session_revalidation()
+            else:
+                _LOGGER.debug("Reusing validated session")
+
+    def _schedule_session_revalidation(self):
+        if self._revalidate_task is None or self._revalidate_task.done():
+            self._revalidate_task = asyncio.create_task(self._revalidate_session())
+
+    async def _revalidate_session(self):
+        async with self._auth_lock:
+            try:
+                if not await self._refresh_token_cookies():
+                    _LOGGER.debug(
+                        "Session is no longer valid, re-authenticating next update"
+                    )
+            except httpx.HTTPError as err:
+                # Nobody awaits this task, so log the error and validate the
+                # session again on the next update.
+                _LOGGER.debug("Could not revalidate the session: %r", err)
+                self._session_validated_at = None
 
     async def stream_reader(self, meter_callback=None):
-        # First, login, etc, make sure we have a token.
-        await self.init_authentication()
+        if self.stream_replay is not None:
+            return await self._replay_stream(meter_callback)
+
+        # First, login, etc, make sure we have a token. The stream is only
+        # (re)connected occasionally, so always validate the session first.
+        await self.init_authentication(revalidate=True)
 
         if not self.is_metering_enabled or self.endpoint_type != ENVOY_MODEL_M:
             _LOGGER.debug(
@@ -1125,6 +2392,9 @@ class EnvoyReader:
         url = ENDPOINT_URL_STREAM.format(self.host)
         _LOGGER.debug("Connecting to %s", url)
 
+        health = self.stream_health
+        health.connecting()
+        stalled = False
         try:
             _LOGGER.debug(
                 "HTTP GET stream: %s: Header:%s Cookies:%s",
@@ -1137,6 +2407,8 @@ class EnvoyReader:
                 url,
                 headers=self._authorization_header,
                 cookies=self._cookies,
+                # Stalls are detected below, based on the time since the last event
+                timeout=httpx.Timeout(30, read=None),
             ) as response:
                 if response.status_code in (401, 404):
                     await response.aread()
@@ -1157,27 +2429,9 @@ class EnvoyReader:
                     )
                     return True  # keep retrying.
 
-                self.is_receiving_realtime_data = True
-                _LOGGER.debug("Starting to read chunks of data.")
-
-                async for chunk in response.aiter_text():
-                    if not chunk.startswith("data:"):
-                        continue
-
-                    try:
-                        reading = json.loads(chunk[6:])
-                    except JSONDecodeError:
-                        _LOGGER.debug("Unable to decode json chunk: %s", chunk[6:])
-                        continue
-
-                    if meter_callback:
-                        try:
-                            meter_callback(StreamData(reading))
-                        except Exception as e:
-                            _LOGGER.exception("Unable to execute callback: %s", e)
-                            raise
-                    else:
-                        print(StreamData(reading))
+                stalled = await self._read_stream(
+                    response.aiter_bytes(), meter_callback
+                )
 
             return True
         except Exception as e:
@@ -1185,20 +2439,129 @@ class EnvoyReader:
         finally:
             _LOGGER.error("Stopped reading realtime data")
             self.is_receiving_realtime_data = False
+            health.disconnected(stalled)
+
+    async def _replay_stream(self, meter_callback):
+        """Read the stream from the replay instead of the Envoy."""
+        _LOGGER.debug("Replaying %s", self.stream_replay.filename)
+        self.stream_health.connecting()
+        try:
+            await self._read_stream(self.stream_replay.aiter_bytes(), meter_callback)
+        finally:
+            self.is_receiving_realtime_data = False
+            self.stream_health.disconnected()
+
+        # A replay is not reconnected
+        return False
+
+    async def _read_stream(self, chunks, meter_callback):
+        """Read the meter stream events from chunks, returns True if it stalled."""
+        health = self.stream_health
+        self.is_receiving_realtime_data = True
+        health.connected()
+        _LOGGER.debug("Starting to read chunks of data.")
+
+        parser = self._stream_parser
+        parser.reset()
+        stream_data = StreamData()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(
+                    anext(chunks),
+                    max(STREAM_STALL_TIMEOUT - health.seconds_without_event(), 0),
+                )
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                _LOGGER.warning(
+                    "No events from /stream/meter for %s seconds, reconnecting",
+                    STREAM_STALL_TIMEOUT,
+                )
+                return True
+
+            if self.stream_recorder:
+                self.stream_recorder.write(chunk)
+
+            for data in parser.feed(chunk):
+                try:
+                    reading = json.loads(data)
+                except (JSONDecodeError, UnicodeDecodeError):
+                    parser.malformed_frames += 1
+                    _LOGGER.debug("Unable to decode json event: %s", data)
+                    continue
+
+                stream_data.update(reading)
+                health.event()
+                if meter_callback:
+                    try:
+                        meter_callback(stream_data)
+                    except Exception as e:
+                        _LOGGER.exception("Unable to execute callback: %s", e)
+                        raise
+                elif not self._stream_subscriptions:
+                    print(stream_data)
+
+                if self._stream_subscriptions:
+                    # Subscribers keep events, so they get their own copy
+                    event = StreamData(reading)
+                    for subscription in self._stream_subscriptions:
+                        subscription.put(event)
+
+        return False
+
+    async def _fetch_endpoint(self, endpoint, endpoint_settings):
+        """Fetch an endpoint, or wait for the fetch of it that is already running."""
+        await self._single_flight(
+            ("endpoint", endpoint),
+            partial(self._fetch_endpoint_now, endpoint, endpoint_settings),
+        )
+
+    async def _fetch_endpoint_now(self, endpoint, endpoint_settings):
+        async with self._request_semaphore:
+            _LOGGER.info("UPDATING ENDPOINT %s: %s", endpoint, endpoint_settings["url"])
+            endpoint_settings["last_fetch"] = time.time()
+            start = time.perf_counter()
+            response = None
+            try:
+                response = await self._update_endpoint(
+                    attr=endpoint,
+                    url=endpoint_settings["url"],
+                )
+            finally:
+                latency = time.perf_counter() - start
+                self.endpoint_stats(endpoint).request(latency, response)
+            _LOGGER.info("FETCHING ENDPOINT %s TOOK %.4f seconds", endpoint, latency)
 
     async def update_endpoints(self, endpoints=None):
         """Update one or more endpoints, and set the appropriate class attribute.
 
         If no endpoint provided, then it will determine the endpoints based on the EnvoyData class.
-        If a endpoint is provided, it needs to be a list of registered endpoints"""
+        If a endpoint is provided, it needs to be a list of registered endpoints.
+
+        Endpoints are fetched concurrently (limited by max_parallel_requests), but the
+        data is always set in the order of the uri_registry, so merging endpoint data
+        (like the meters endpoints) gives the same result on every update."""
         if endpoints == None:
             endpoints = self.data.required_endpoints | self.required_endpoints
 
         _LOGGER.info("Updating endpoints %s", endpoints)
+        registry_order = {attr: index for index, attr in enumerate(self.uri_registry)}
+        endpoints = sorted(
+            endpoints, key=lambda e: registry_order.get(e, len(registry_order))
+        )
+
+        updated_endpoints = []
+        fetched_endpoints = []
+        fetches = []
+        stream_healthy = self.stream_reduces_polling and self.is_stream_healthy
         for endpoint in endpoints:
             endpoint_settings = self.uri_registry.get(endpoint)
 
             _LOGGER.info("VALIDATING ENDPOINT %s", endpoint)
+            if endpoint_settings == None:
+                _LOGGER.error(f"No settings found for uri {endpoint}")
+                continue
+
             if endpoint_settings["optional"] and endpoint in self.disabled_endpoints:
                 _LOGGER.info(
                     "Skipping update of disabled %s: %s",
@@ -1207,10 +2570,6 @@ class EnvoyReader:
                 )
                 continue
 
-            if endpoint_settings == None:
-                _LOGGER.error(f"No settings found for uri {endpoint}")
-                continue
-
             if endpoint_settings["installer_required"] and (
                 self.token_type != "installer" or self.disable_installer_account_use
             ):
@@ -1223,32 +2582,47 @@ class EnvoyReader:
                 )
                 continue
 
+            updated_endpoints.append(endpoint)
             endpoint_settings.setdefault("last_fetch", 0)
             time_since_last_fetch = time.time() - endpoint_settings["last_fetch"]
-            if time_since_last_fetch > endpoint_settings["cache_time"]:
-                _LOGGER.info(
-                    "UPDATING ENDPOINT %s: %s", endpoint, endpoint_settings["url"]
-                )
-                endpoint_settings["last_fetch"] = time.time()
-                await self._update_endpoint(
-                    attr=endpoint,
-                    url=endpoint_settings["url"],
-                )
-                _LOGGER.info(
-                    "FETCHING ENDPOINT %s TOOK %.4f seconds",
-                    endpoint,
-                    time.time() - endpoint_settings["last_fetch"],
-                )
+            cache_time = (
+                endpoint_settings["poll_interval"]
+                if self.adaptive_polling
+                else endpoint_settings["cache_time"]
+            )
+            if stream_healthy and endpoint_settings.get("stream_cache_time"):
+                # The stream delivers (most of) this data, fall back when it stalls
+                cache_time = max(cache_time, endpoint_settings["stream_cache_time"])
+            if (
+                time_since_last_fetch > cache_time
+                or ("endpoint", endpoint) in self._inflight
+            ):
+                fetched_endpoints.append(endpoint)
+                fetches.append(self._fetch_endpoint(endpoint, endpoint_settings))
             else:
+                self.endpoint_stats(endpoint).counters["not_due"] += 1
                 _LOGGER.info(
                     "Skipping update of %s: last fetch: %s, cache time: %s",
                     endpoint,
                     endpoint_settings["last_fetch"],
-                    endpoint_settings["cache_time"],
+                    cache_time,
                 )
 
-            if self.data:
-                self.data.set_endpoint_data(endpoint, getattr(self, endpoint))
+        # Wait for all fetches to finish before raising any error, so no
+        # request is left running in the background.
+        for result in await asyncio.gather(*fetches, return_exceptions=True):
+            if isinstance(result, BaseException):
+                raise result
+
+        if self.data:
+            for endpoint in updated_endpoints:
+                changed = self.data.set_endpoint_data(endpoint, getattr(self, endpoint))
+                if (
+                    self.adaptive_polling
+                    and endpoint in fetched_endpoints
+                    and changed is not None
+                ):
+                    self._adapt_poll_interval(endpoint, changed)
 
     async def get_data(self, get_inverters=True):
         """
@@ -1257,6 +2631,9 @@ class EnvoyReader:
         """
         await self.init_authentication()
 
+        for stats in self._endpoint_stats.values():
+            stats.cycle_time = 0
+
         if not self.endpoint_type:
             await self.detect_model()
 
@@ -1430,21 +2807,31 @@ class EnvoyReader:
     async def set_storage(self, storage_key, storage_value):
         if self.endpoint_admin_tariff is not None:
             formatted_url = ENVOY_ENDPOINTS["admin_tariff"]["url"].format(self.host)
-            tariff = self.data.get("tariff")
+            # Do not change the cached tariff, in case the Envoy rejects it
+            tariff = copy.deepcopy(self.data.get("tariff"))
             tariff["storage_settings"][storage_key] = storage_value
 
             await self._async_put(formatted_url, data={"tariff": tariff})
             # Make sure the next poll will update the endpoint.
             self._clear_endpoint_cache("endpoint_admin_tariff")
 
-    def run_stream(self):
+    def run_stream(self, record=None, replay=None, speed=1.0):
+        """Print the stream, optionally recording it to or replaying it from a file."""
         print("Reading stream...")
         loop = asyncio.get_event_loop()
         self.data = EnvoyMeteredWithCT(self)
         self.endpoint_type = ENVOY_MODEL_M
-        loop.run_until_complete(
-            asyncio.gather(self.stream_reader(), return_exceptions=False)
-        )
+        if record:
+            self.stream_recorder = StreamRecorder(record)
+        if replay:
+            self.stream_replay = StreamReplay(replay, speed)
+        try:
+            loop.run_until_complete(
+                asyncio.gather(self.stream_reader(), return_exceptions=False)
+            )
+        finally:
+            if self.stream_recorder:
+                self.stream_recorder.close()
 
     async def get_data_loop(self, no_url_cache_loop=False):
         # We iterate multiple times to see if the url caching works.
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import datetime
 import logging
+import time
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -25,11 +26,36 @@ from .const import (
     ENABLE_ADDITIONAL_METRICS,
     ADDITIONAL_METRICS,
     BATTERY_STATE_MAPPING,
+    DEFAULT_REALTIME_MAX_SILENCE,
+    DEFAULT_REALTIME_DEADBANDS,
+    DEFAULT_REALTIME_DEADBAND_RELATIVE,
+    REALTIME_DEADBAND_QUANTITIES,
+    REALTIME_DEADBAND_RELATIVE_QUANTITIES,
+    STREAM_TOTAL_KEYS,
     resolve_hardware_id,
     get_model_name,
 )
 
 
+def realtime_deadband(options, key):
+    """Return the (absolute, relative) realtime deadband of a key from the options."""
+    quantity = REALTIME_DEADBAND_QUANTITIES.get(key)
+    if quantity is None:
+        return None
+    absolute = options.get(
+        f"realtime_deadband_{quantity}", DEFAULT_REALTIME_DEADBANDS[quantity]
+    )
+    relative = 0
+    if quantity in REALTIME_DEADBAND_RELATIVE_QUANTITIES:
+        relative = (
+            options.get(
+                "realtime_deadband_relative", DEFAULT_REALTIME_DEADBAND_RELATIVE
+            )
+            / 100
+        )
+    return absolute, relative
+
+
 async def async_setup_entry(
     hass: HomeAssistant,
     config_entry: ConfigEntry,
@@ -238,6 +264,31 @@ async def async_setup_entry(
                     )
                 )
 
+        elif sensor_description.key in STREAM_TOTAL_KEYS:
+            # Updated by the realtime stream when it reduces the polling
+            data = coordinator.data.get(sensor_description.key)
+            if data is None:
+                continue
+
+            live_entities[sensor_description.key] = LiveEnvoyEntity(
+                description=sensor_description,
+                name=f"{name} {sensor_description.name}",
+                device_name=name,
+                device_serial_number=config_entry.unique_id,
+                serial_number=None,
+                coordinator=coordinator,
+                device_host=config_entry.data[CONF_HOST],
+                deadband=(
+                    realtime_deadband(options, sensor_description.key)
+                    if options.get("realtime_deadband", True)
+                    else None
+                ),
+                max_silence=options.get(
+                    "realtime_max_silence", DEFAULT_REALTIME_MAX_SILENCE
+                ),
+            )
+            entities.append(live_entities[sensor_description.key])
+
         else:
             data = coordinator.data.get(sensor_description.key)
             if data is None:
@@ -264,7 +315,7 @@ async def async_setup_entry(
         if data is None:
             continue
 
-        live_entities[sensor_description.key] = CoordinatedEnvoyEntity(
+        live_entities[sensor_description.key] = LiveEnvoyEntity(
             description=sensor_description,
             name=f"{name} {sensor_description.name}",
             device_name=name,
@@ -272,6 +323,14 @@ async def async_setup_entry(
             serial_number=None,
             coordinator=coordinator,
             device_host=config_entry.data[CONF_HOST],
+            deadband=(
+                realtime_deadband(options, sensor_description.key)
+                if options.get("realtime_deadband", True)
+                else None
+            ),
+            max_silence=options.get(
+                "realtime_max_silence", DEFAULT_REALTIME_MAX_SILENCE
+            ),
         )
         entities.append(live_entities[sensor_description.key])
 
@@ -360,6 +419,65 @@ class CoordinatedEnvoyEntity(EnvoyEntity, CoordinatorEntity):
         )
 
 
+class LiveEnvoyEntity(CoordinatedEnvoyEntity):
+    """Envoy entity that is also updated by the realtime meter stream."""
+
+    def __init__(self, *args, deadband=None, max_silence=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._window_min = None
+        self._window_max = None
+        self._deadband = deadband
+        self._max_silence = max_silence
+        self._written_value = None
+        self._written_window = (None, None)
+        self._written_at = None
+
+    def set_window(self, minimum, maximum):
+        """Set the min/max of the last realtime window."""
+        self._window_min = minimum
+        self._window_max = maximum
+
+    def is_significant_change(self, value):
+        """Return True if a realtime value should be written to the state.
+
+        Changes of the value and the window min/max within the deadband are
+        skipped, unless nothing has been written for max_silence seconds."""
+        if (
+            self._max_silence
+            and self._written_at is not None
+            and time.monotonic() - self._written_at >= self._max_silence
+        ):
+            return True
+
+        return any(
+            self._exceeds_deadband(new, last)
+            for new, last in zip(
+                (value, self._window_min, self._window_max),
+                (self._written_value, *self._written_window),
+            )
+        )
+
+    def _exceeds_deadband(self, value, last):
+        if value is None or last is None or self._deadband is None:
+            return value != last
+        absolute, relative = self._deadband
+        return abs(value - last) > max(absolute, relative * abs(last))
+
+    @callback
+    def async_write_ha_state(self):
+        self._written_value = self.native_value
+        self._written_window = (self._window_min, self._window_max)
+        self._written_at = time.monotonic()
+        super().async_write_ha_state()
+
+    @property
+    def extra_state_attributes(self):
+        """Return the state attributes."""
+        if self._window_min is None:
+            return None
+        return {"min": self._window_min, "max": self._window_max}
+
+
 class EnvoyDeviceEntity(CoordinatorEntity, SensorEntity):
 
     def __init__(
@@ -407,20 +525,17 @@ class EnvoyInverterEntity(EnvoyDeviceEntity):
                     .get("lastReportWatts")
                 )
         elif self.entity_description.key.startswith("inverter_data_"):
-            if self.coordinator.data.get("inverter_device_data"):
-                value = (
-                    self.coordinator.data.get("inverter_device_data")
-                    .get(self._device_serial_number)
-                    .get(self.entity_description.key[14:])
+            device_data = self.coordinator.data.get("inverter_device_data")
+            if device_data:
+                value = device_data.value(
+                    self._device_serial_number, self.entity_description.key[14:]
                 )
                 if self.entity_description.key.endswith("last_reading"):
                     return datetime.datetime.fromtimestamp(
                         int(value), tz=datetime.timezone.utc
                     )
                 if (
-                    self.coordinator.data.get("inverter_device_data")
-                    .get(self._device_serial_number)
-                    .get("gone")
+                    device_data.value(self._device_serial_number, "gone")
                     and not self.entity_description.retain
                 ):
                     return None
@@ -464,11 +579,10 @@ class EnvoyInverterEntity(EnvoyDeviceEntity):
                         )
                     }
             elif self.entity_description.key.startswith("inverter_data_"):
-                if self.coordinator.data.get("inverter_device_data"):
-                    value = (
-                        self.coordinator.data.get("inverter_device_data")
-                        .get(self._device_serial_number)
-                        .get("last_reading")
+                device_data = self.coordinator.data.get("inverter_device_data")
+                if device_data:
+                    value = device_data.value(
+                        self._device_serial_number, "last_reading"
                     )
                     return {
                         "last_reported": datetime.datetime.fromtimestamp(
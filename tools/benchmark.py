@@ -0,0 +1,384 @@
+"""Benchmark a full polling cycle of the EnvoyReader.
+
+A cycle is EnvoyReader.get_data() followed by all_values, against
+tools/envoy_simulator.py serving fixtures of tools/generate_fleet.py. It runs for
+every data class, token type and fleet scale, and measures:
+
+- wall: wall time of the cycle
+- cpu_fetch: CPU time of get_data() outside of parsing (requests, scheduling)
+- cpu_parse: CPU time of EnvoyData.set_endpoint_data()
+- cpu_resolve: CPU time of all_values
+- peak_memory, retained_memory and retained_blocks: traced with tracemalloc, in
+  a separate cycle as tracing slows everything down
+
+A cold cycle uses a new reader (after authentication), so every endpoint is
+fetched and parsed. A warm cycle polls every endpoint again with the same reader,
+which gets 304 Not Modified responses from the simulator.
+
+By default the reader keeps its httpx client (and its connections) open between
+requests. With --clients pooled,per_request the same cycles are also measured
+with a new client for every request, which pays the TCP connect, TLS handshake
+and SSLContext for each of them, like the reader did before it had a pool.
+
+    python tools/benchmark.py --scales 1,10,100 --output benchmark-0.6.9.json
+    python tools/benchmark.py --compare benchmark-0.6.9.json
+    python tools/benchmark.py --scales 1 --clients pooled,per_request --latency 20
+
+The simulator runs in a subprocess, so it does not show up in the CPU and memory
+numbers.
+"""
+
+import argparse
+import asyncio
+import datetime
+import importlib
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+import generate_fleet
+from envoy_simulator import COMPONENT, make_token
+
+DATA_CLASSES = ("EnvoyStandard", "EnvoyMetered", "EnvoyMeteredWithCT")
+TOKEN_TYPES = ("owner", "installer")
+TIMINGS = ("wall", "cpu_fetch", "cpu_parse", "cpu_resolve")
+CLIENTS = ("pooled", "per_request")
+
+
+def _load_reader():
+    """Import envoy_reader without the Home Assistant parts of the package."""
+    package = types.ModuleType("enphase_envoy")
+    package.__path__ = [COMPONENT]
+    sys.modules.setdefault("enphase_envoy", package)
+    return importlib.import_module("enphase_envoy.envoy_reader")
+
+
+envoy_reader = _load_reader()
+
+
+class Store:
+    """Minimal stand-in for the Home Assistant Store holding the token."""
+
+    def __init__(self, token):
+        self.data = {"token": token}
+
+    async def async_load(self):
+        return self.data
+
+    async def async_save(self, data):
+        self.data = data
+
+
+class ClientPerRequest:
+    """Client that does every request with a new httpx client."""
+
+    async def _request(self, method, *args, **kwargs):
+        async with envoy_reader.EnvoyReader._create_async_client() as client:
+            return await getattr(client, method)(*args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await self._request("get", *args, **kwargs)
+
+    async def post(self, *args, **kwargs):
+        return await self._request("post", *args, **kwargs)
+
+    async def put(self, *args, **kwargs):
+        return await self._request("put", *args, **kwargs)
+
+
+class BenchmarkReader(envoy_reader.EnvoyReader):
+    """EnvoyReader with a fixed data class, that measures the parse time."""
+
+    def __init__(self, host, data_class, token_type, client="pooled"):
+        super().__init__(host, inverters=True, store=Store(make_token(token_type)))
+        self.data_class = getattr(envoy_reader, data_class)
+        self.client = client
+        self.parse_time = 0
+        self._time_parsing()
+
+    @property
+    def async_client(self):
+        if self.client == "per_request":
+            return ClientPerRequest()
+        return super().async_client
+
+    def _time_parsing(self):
+        set_endpoint_data = self.data.set_endpoint_data
+
+        def timed_set_endpoint_data(endpoint, response):
+            start = time.thread_time()
+            try:
+                return set_endpoint_data(endpoint, response)
+            finally:
+                self.parse_time += time.thread_time() - start
+
+        self.data.set_endpoint_data = timed_set_endpoint_data
+
+    async def detect_model(self):
+        await self.update_endpoints(["endpoint_production_json"])
+        self.endpoint_type = (
+            envoy_reader.ENVOY_MODEL_S
+            if self.data_class is envoy_reader.EnvoyStandard
+            else envoy_reader.ENVOY_MODEL_M
+        )
+        self.data = self.data_class(self)
+        self._time_parsing()
+
+    def expire_cache(self):
+        """Make every endpoint due for the next update."""
+        for endpoint_settings in self.uri_registry.values():
+            endpoint_settings["last_fetch"] = 0
+
+
+async def _new_reader(host, data_class, token_type, client="pooled"):
+    reader = BenchmarkReader(host, data_class, token_type, client)
+    if client == "pooled":
+        await reader.open()
+    await reader._sync_store(load=True)
+    await reader.init_authentication()
+    return reader
+
+
+async def _cycle(reader):
+    """Run one polling cycle, returns the timings and the number of values."""
+    reader.parse_time = 0
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    await reader.get_data()
+    cpu_get_data = time.thread_time() - cpu
+    resolve = time.thread_time()
+    values = reader.all_values
+    cpu_resolve = time.thread_time() - resolve
+    return {
+        "wall": time.perf_counter() - wall,
+        "cpu_fetch": cpu_get_data - reader.parse_time,
+        "cpu_parse": reader.parse_time,
+        "cpu_resolve": cpu_resolve,
+    }, len(values)
+
+
+def _summary(cycles):
+    return {
+        timing: {
+            "median": statistics.median(cycle[timing] for cycle in cycles),
+            "min": min(cycle[timing] for cycle in cycles),
+            "max": max(cycle[timing] for cycle in cycles),
+        }
+        for timing in TIMINGS
+    }
+
+
+async def _memory(host, data_class, token_type, client="pooled"):
+    """Trace the memory of a cold cycle."""
+    reader = await _new_reader(host, data_class, token_type, client)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        current = tracemalloc.get_traced_memory()[0]
+        await _cycle(reader)
+        peak = tracemalloc.get_traced_memory()[1]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    await reader.aclose()
+
+    retained = after.compare_to(before, "filename")
+    return {
+        "peak_memory": peak - current,
+        "retained_memory": sum(stat.size_diff for stat in retained),
+        "retained_blocks": sum(stat.count_diff for stat in retained),
+    }
+
+
+async def benchmark(host, data_class, token_type, repeat, client="pooled"):
+    """Benchmark one data class and token type against the simulator at host."""
+    cold = []
+    for _ in range(repeat):
+        reader = await _new_reader(host, data_class, token_type, client)
+        timings, values = await _cycle(reader)
+        cold.append(timings)
+        await reader.aclose()
+
+    warm = []
+    reader = await _new_reader(host, data_class, token_type, client)
+    await _cycle(reader)
+    for _ in range(repeat):
+        reader.expire_cache()
+        warm.append((await _cycle(reader))[0])
+    await reader.aclose()
+
+    return {
+        "values": values,
+        "cold": _summary(cold),
+        "warm": _summary(warm),
+        **await _memory(host, data_class, token_type, client),
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_simulator(test_data, latency=0, validators=True):
+    """Start tools/envoy_simulator.py in a subprocess, returns (process, host)."""
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-u",
+            os.path.join(
+                os.path.dirname(os.path.abspath(__file__)), "envoy_simulator.py"
+            ),
+            "--port",
+            str(port),
+            "--test-data",
+            test_data,
+            "--latency",
+            str(latency),
+        ]
+        + ([] if validators else ["--no-validators"]),
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    # The simulator prints its address once it is listening
+    process.stdout.readline()
+    return process, f"127.0.0.1:{port}"
+
+
+def run(scales, data_classes, token_types, repeat, latency=0, clients=("pooled",)):
+    """Run the benchmarks, returns the results as a JSON serializable dict."""
+    results = []
+    base_counts = generate_fleet.base_counts()
+    for scale in scales:
+        inverters, relays, batteries = (round(count * scale) for count in base_counts)
+        with tempfile.TemporaryDirectory() as test_data:
+            generate_fleet.write(test_data, inverters, relays, batteries)
+            process, host = start_simulator(test_data, latency)
+            try:
+                for data_class in data_classes:
+                    for token_type in token_types:
+                        for client in clients:
+                            result = asyncio.run(
+                                benchmark(host, data_class, token_type, repeat, client)
+                            )
+                            results.append(
+                                {
+                                    "data_class": data_class,
+                                    "token_type": token_type,
+                                    "client": client,
+                                    "scale": scale,
+                                    "inverters": inverters,
+                                    "relays": relays,
+                                    "batteries": batteries,
+                                    **result,
+                                }
+                            )
+                            print(_format(results[-1]), flush=True)
+            finally:
+                process.terminate()
+                process.wait()
+
+    with open(os.path.join(COMPONENT, "manifest.json")) as f:
+        version = json.load(f)["version"]
+
+    return {
+        "version": version,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "latency": latency,
+        "results": results,
+    }
+
+
+def _key(result):
+    return (
+        result["data_class"],
+        result["token_type"],
+        result.get("client", "pooled"),
+        result["scale"],
+    )
+
+
+def _format(result):
+    return (
+        f"{result['data_class']:<19} {result['token_type']:<9} "
+        f"{result.get('client', 'pooled'):<11} "
+        f"x{result['scale']:<5g} {result['inverters']:>6} inverters  "
+        f"cold {result['cold']['wall']['median'] * 1000:8.1f} ms "
+        f"(parse {result['cold']['cpu_parse']['median'] * 1000:.1f}, "
+        f"resolve {result['cold']['cpu_resolve']['median'] * 1000:.1f})  "
+        f"warm {result['warm']['wall']['median'] * 1000:8.1f} ms  "
+        f"peak {result['peak_memory'] / 1024:8.0f} KiB"
+    )
+
+
+def compare(results, previous, threshold=0.1):
+    """Print the change of the median wall times against previous results."""
+    previous_results = {_key(result): result for result in previous["results"]}
+    print(f"Compared to {previous['version']} ({previous['date']}):")
+    for result in results["results"]:
+        old = previous_results.get(_key(result))
+        if old is None:
+            continue
+        changes = []
+        for cycle in ("cold", "warm"):
+            ratio = result[cycle]["wall"]["median"] / old[cycle]["wall"]["median"]
+            flag = " REGRESSION" if ratio > 1 + threshold else ""
+            changes.append(f"{cycle} {ratio - 1:+7.1%}{flag}")
+        ratio = result["peak_memory"] / max(old["peak_memory"], 1)
+        changes.append(f"peak memory {ratio - 1:+7.1%}")
+        print(
+            f"{result['data_class']:<19} {result['token_type']:<9} "
+            f"{result.get('client', 'pooled'):<11} "
+            f"x{result['scale']:<5g} " + "  ".join(changes)
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scales", default="1,10,100", help="fleet scale factors, see generate_fleet"
+    )
+    parser.add_argument("--data-classes", default=",".join(DATA_CLASSES))
+    parser.add_argument("--token-types", default=",".join(TOKEN_TYPES))
+    parser.add_argument(
+        "--clients", default="pooled", help="pooled and/or per_request, see above"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="cycles per benchmark")
+    parser.add_argument(
+        "--latency", type=float, default=0, help="simulated ms per request"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    args = parser.parse_args()
+
+    results = run(
+        [float(scale) for scale in args.scales.split(",")],
+        args.data_classes.split(","),
+        args.token_types.split(","),
+        args.repeat,
+        args.latency,
+        args.clients.split(","),
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
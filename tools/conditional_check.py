@@ -0,0 +1,89 @@
+"""Check that conditional requests give the same values as full responses.
+
+For every data class and token type, a reader polls tools/envoy_simulator.py
+twice: once when the simulator sends ETag and Last-Modified, so the second cycle
+gets 304 Not Modified responses, and once with --no-validators, like firmware
+without them, so every cycle gets full 200 responses. all_values of all these
+cycles must be the same.
+
+    python tools/conditional_check.py
+"""
+
+import argparse
+import asyncio
+import sys
+from collections.abc import Mapping
+
+import generate_fleet
+from benchmark import DATA_CLASSES, TOKEN_TYPES, _new_reader, start_simulator
+
+
+def _plain(value):
+    """Return value with Mappings (like DeviceTelemetry) as dicts, to compare."""
+    if isinstance(value, Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+async def _poll(host, data_class, token_type):
+    """Return all_values of two cycles and the number of 304 responses."""
+    reader = await _new_reader(host, data_class, token_type)
+    cycles = []
+    for _ in range(2):
+        reader.expire_cache()
+        await reader.get_data()
+        cycles.append(_plain(reader.all_values))
+    not_modified = sum(
+        stats.counters["not_modified"] for stats in reader._endpoint_stats.values()
+    )
+    await reader.aclose()
+    return cycles, not_modified
+
+
+def check(data_classes, token_types, test_data=generate_fleet.TEST_DATA):
+    """Run the check, returns True if all values are the same."""
+    results = {}
+    for validators in (True, False):
+        process, host = start_simulator(test_data, validators=validators)
+        try:
+            for data_class in data_classes:
+                for token_type in token_types:
+                    results[validators, data_class, token_type] = asyncio.run(
+                        _poll(host, data_class, token_type)
+                    )
+        finally:
+            process.terminate()
+            process.wait()
+
+    ok = True
+    for data_class in data_classes:
+        for token_type in token_types:
+            conditional, not_modified = results[True, data_class, token_type]
+            full, full_not_modified = results[False, data_class, token_type]
+            same = conditional[0] == conditional[1] == full[0] == full[1]
+            # Without validators the reader must fall back to full responses
+            fell_back = full_not_modified == 0
+            ok = ok and same and not_modified > 0 and fell_back
+            print(
+                f"{data_class:<19} {token_type:<9} "
+                f"{len(full[0])} values {'same' if same else 'DIFFERENT'}, "
+                f"{not_modified} not modified with validators, "
+                f"{full_not_modified} without"
+            )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data-classes", default=",".join(DATA_CLASSES))
+    parser.add_argument("--token-types", default=",".join(TOKEN_TYPES))
+    args = parser.parse_args()
+
+    if not check(args.data_classes.split(","), args.token_types.split(",")):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
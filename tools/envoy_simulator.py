@@ -0,0 +1,415 @@
+"""Local HTTPS stand-in for an Envoy, serving the fixtures of test_data/.
+
+It emulates the parts of the Envoy the integration talks to: the endpoints of
+envoy_endpoints.py (with ETag and Last-Modified, unless --no-validators
+emulates firmware without them), the JWT check at /auth/check_jwt that hands out
+a session cookie, and the /stream/meter server-sent events stream. Latency,
+jitter and errors can be injected, so the real EnvoyReader code can be
+benchmarked end-to-end without hardware.
+
+Run it from the repository root:
+
+    python tools/envoy_simulator.py --port 8443 --latency 50 --jitter 20
+
+and use the printed token and 127.0.0.1:8443 as host for the EnvoyReader. From
+code, use EnvoySimulator(...).start() and .stop().
+"""
+
+import argparse
+import email.utils
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import secrets
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import jwt
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPONENT = os.path.join(ROOT, "custom_components", "enphase_envoy")
+TEST_DATA = os.path.join(ROOT, "test_data", "envoy_metered")
+
+
+def _load_module(name):
+    """Load a module of the integration without importing Home Assistant."""
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(COMPONENT, f"{name}.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def fixture_routes(test_data=TEST_DATA):
+    """Return {url path: fixture file} for the endpoints of envoy_endpoints.py."""
+    endpoints = _load_module("envoy_endpoints").ENVOY_ENDPOINTS
+    fixtures = _load_module("envoy_test_data").ENVOY_ENDPOINTS
+    routes = {}
+    for key, endpoint in endpoints.items():
+        path = urlsplit(endpoint["url"].format("envoy")).path
+        filename = os.path.basename(fixtures[key]["url"])
+        routes[path] = os.path.join(test_data, filename)
+    return routes
+
+
+def make_token(user="installer", lifetime=365 * 24 * 3600):
+    """Return a JWT the simulator accepts (the signature is not checked)."""
+    return jwt.encode(
+        {"enphaseUser": user, "exp": int(time.time()) + lifetime},
+        secrets.token_hex(32),
+        algorithm="HS256",
+    )
+
+
+def make_certificate(directory):
+    """Create a self-signed certificate with openssl, returns (cert, key)."""
+    certfile = os.path.join(directory, "envoy.crt")
+    keyfile = os.path.join(directory, "envoy.key")
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "365",
+            "-subj",
+            "/CN=envoy.local",
+            "-keyout",
+            keyfile,
+            "-out",
+            certfile,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return certfile, keyfile
+
+
+class StreamSource:
+    """Events for /stream/meter, based on the production report fixture."""
+
+    def __init__(self, test_data=TEST_DATA):
+        with open(os.path.join(test_data, "endpoint_production_report.json")) as f:
+            lines = json.load(f)["lines"]
+        self.phases = [
+            {
+                "p": line["currW"],
+                "q": line["reactPwr"],
+                "s": line["apprntPwr"],
+                "v": line["rmsVoltage"],
+                "i": line["rmsCurrent"],
+                "pf": line["pwrFactor"],
+                "f": line["freqHz"],
+            }
+            for line in lines
+        ]
+
+    def event(self):
+        """Return the next event, the fixture values with some noise."""
+        meters = {}
+        for meter, factor in (
+            ("production", 1),
+            ("net-consumption", -0.4),
+            ("total-consumption", 0.6),
+        ):
+            meters[meter] = {}
+            for phase, values in zip(("ph-a", "ph-b", "ph-c"), self.phases):
+                noise = random.uniform(0.98, 1.02)
+                meters[meter][phase] = {
+                    key: (
+                        round(value * factor * noise, 3)
+                        if key in ("p", "q", "s", "i")
+                        else value
+                    )
+                    for key, value in values.items()
+                }
+        return b"data: " + json.dumps(meters).encode() + b"\r\n\r\n"
+
+
+class EnvoySimulator:
+    """HTTPS server that behaves like an Envoy, see the module docstring."""
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        test_data=TEST_DATA,
+        certfile=None,
+        keyfile=None,
+        latency=0,
+        jitter=0,
+        error_rate=0,
+        session_lifetime=None,
+        stream_rate=1,
+        validators=True,
+    ):
+        self.routes = fixture_routes(test_data)
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.error_rate = error_rate
+        self.session_lifetime = session_lifetime
+        self.stream_rate = stream_rate
+        self.validators = validators
+        self.stream_source = StreamSource(test_data)
+        self.sessions = {}
+        self.stats = {"connections": 0, "requests": 0, "not_modified": 0, "errors": 0}
+        self._fixtures = {}
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self._tempdir = None
+        if not certfile:
+            self._tempdir = tempfile.TemporaryDirectory()
+            certfile, keyfile = make_certificate(self._tempdir.name)
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        self._thread = None
+
+    @property
+    def address(self):
+        """host:port to use as Envoy host."""
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self.server.shutdown()
+        self.server.server_close()
+        if self._tempdir:
+            self._tempdir.cleanup()
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def fixture(self, filename):
+        """Return (body, etag, last_modified) of a fixture, read once."""
+        if filename not in self._fixtures:
+            with open(filename, "rb") as f:
+                body = f.read()
+            self._fixtures[filename] = (
+                body,
+                f'"{hashlib.md5(body).hexdigest()}"',
+                email.utils.formatdate(os.path.getmtime(filename), usegmt=True),
+            )
+        return self._fixtures[filename]
+
+    def new_session(self):
+        session_id = secrets.token_hex(16)
+        with self._lock:
+            self.sessions[session_id] = time.monotonic()
+        return session_id
+
+    def is_authorized(self, headers):
+        """A valid session cookie, or a bearer token that is not expired."""
+        return self.has_valid_session(headers) or self.is_token_valid(
+            headers.get("Authorization", "")
+        )
+
+    def has_valid_session(self, headers):
+        for cookie in headers.get_all("Cookie") or []:
+            for part in cookie.split(";"):
+                name, _, value = part.strip().partition("=")
+                if name == "sessionId" and value in self.sessions:
+                    created = self.sessions[value]
+                    if (
+                        self.session_lifetime is None
+                        or time.monotonic() - created < self.session_lifetime
+                    ):
+                        return True
+        return False
+
+    def is_token_valid(self, authorization):
+        if not authorization.startswith("Bearer "):
+            return False
+        try:
+            jwt.decode(
+                authorization[7:],
+                options={"verify_signature": False, "verify_exp": True},
+            )
+        except jwt.PyJWTError:
+            return False
+        return True
+
+    def _handler(self):
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                simulator.count("connections")
+                super().setup()
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, body=b"", content_type="application/json", **hdr):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in hdr.items():
+                    self.send_header(name.replace("_", "-"), value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def delay(self):
+                delay = simulator.latency + random.uniform(
+                    -simulator.jitter, simulator.jitter
+                )
+                if delay > 0:
+                    time.sleep(delay)
+
+            def inject_error(self):
+                if random.random() < simulator.error_rate:
+                    simulator.count("errors")
+                    self.send(503, b"Service Unavailable", "text/plain")
+                    return True
+                return False
+
+            def do_POST(self):
+                simulator.count("requests")
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                self.delay()
+                if self.inject_error():
+                    return
+
+                if urlsplit(self.path).path != "/auth/check_jwt":
+                    return self.send(404, b"{}")
+                if not simulator.is_token_valid(self.headers.get("Authorization", "")):
+                    return self.send(401, b"<h2>Invalid token.</h2>", "text/html")
+                self.send(
+                    200,
+                    b"<!DOCTYPE html><h2>Valid token.</h2>",
+                    "text/html",
+                    Set_Cookie=f"sessionId={simulator.new_session()}; Path=/",
+                )
+
+            def do_GET(self):
+                simulator.count("requests")
+                path = urlsplit(self.path).path
+                self.delay()
+                if self.inject_error():
+                    return
+                if not simulator.is_authorized(self.headers):
+                    return self.send(401, b"Unauthorized", "text/plain")
+
+                if path == "/stream/meter":
+                    return self.stream()
+
+                filename = simulator.routes.get(path)
+                if filename is None or not os.path.exists(filename):
+                    return self.send(404, b"{}")
+
+                body, etag, last_modified = simulator.fixture(filename)
+                content_type = (
+                    "application/xml"
+                    if filename.endswith(".xml")
+                    else "application/json"
+                )
+                if not simulator.validators:
+                    return self.send(200, body, content_type)
+
+                if (
+                    self.headers.get("If-None-Match") == etag
+                    or self.headers.get("If-Modified-Since") == last_modified
+                ):
+                    simulator.count("not_modified")
+                    return self.send(304, ETag=etag, Last_Modified=last_modified)
+
+                self.send(
+                    200, body, content_type, ETag=etag, Last_Modified=last_modified
+                )
+
+            def stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                interval = 1 / simulator.stream_rate
+                next_event = time.monotonic()
+                try:
+                    while not simulator._stopping.is_set():
+                        self.wfile.write(simulator.stream_source.event())
+                        self.wfile.flush()
+                        next_event += interval
+                        time.sleep(max(next_event - time.monotonic(), 0))
+                except (BrokenPipeError, ConnectionResetError, ssl.SSLError):
+                    pass
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--test-data", default=TEST_DATA)
+    parser.add_argument("--certfile", help="default: a generated self-signed one")
+    parser.add_argument("--keyfile")
+    parser.add_argument("--latency", type=float, default=0, help="ms per request")
+    parser.add_argument("--jitter", type=float, default=0, help="+/- ms per request")
+    parser.add_argument(
+        "--error-rate", type=float, default=0, help="fraction of requests with a 503"
+    )
+    parser.add_argument(
+        "--session-lifetime", type=float, help="seconds before a session expires"
+    )
+    parser.add_argument(
+        "--stream-rate", type=float, default=1, help="/stream/meter events per second"
+    )
+    parser.add_argument(
+        "--no-validators",
+        action="store_true",
+        help="send no ETag and Last-Modified, like older firmware",
+    )
+    args = parser.parse_args()
+
+    simulator = EnvoySimulator(
+        host=args.host,
+        port=args.port,
+        test_data=args.test_data,
+        certfile=args.certfile,
+        keyfile=args.keyfile,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        session_lifetime=args.session_lifetime,
+        stream_rate=args.stream_rate,
+        validators=not args.no_validators,
+    )
+    print(f"Envoy simulator on https://{simulator.address}")
+    print(f"Installer token: {make_token()}")
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+        print(json.dumps(simulator.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Generate test_data fixtures for a large fleet of devices.
+
+The devices of test_data/envoy_metered are used as templates, and copied for the
+requested number of inverters, relays and batteries. The serial numbers are the
+same in all generated fixtures (inventory, device_data, devstatus,
+production_inverters, ensemble_inventory and pcu_comm_check), and the other
+fixtures are copied as is, so the result is a complete fixture directory for
+envoy_test_data.py or tools/envoy_simulator.py.
+
+    python tools/generate_fleet.py --inverters 2000 --relays 20 --batteries 10 out/
+    python tools/generate_fleet.py --scale 100 out/
+
+--scale multiplies the number of devices in test_data/envoy_metered.
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import shutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATA = os.path.join(ROOT, "test_data", "envoy_metered")
+
+INVERTER_SERIAL = "999991{:06d}"
+RELAY_SERIAL = "999992{:06d}"
+BATTERY_SERIAL = "999993{:06d}"
+# device_data is keyed by device id, which are 256 apart per device type
+PCU_DEVICE_ID = 553648384
+NSRB_DEVICE_ID = 738197760
+
+
+def _load(test_data, name):
+    with open(os.path.join(test_data, f"endpoint_{name}.json")) as f:
+        return json.load(f)
+
+
+def _inventory_templates(inventory):
+    return {group["type"]: group["devices"] for group in inventory}
+
+
+def _vary(value, rng, spread=0.2):
+    """Return value with a random deviation, of the same type."""
+    varied = value * rng.uniform(1 - spread, 1 + spread)
+    return int(varied) if isinstance(value, int) else round(varied, 3)
+
+
+def generate(inverters, relays, batteries, test_data=TEST_DATA, seed=0):
+    """Return {fixture filename: data} for a fleet of this size."""
+    rng = random.Random(seed)
+    inverter_serials = [INVERTER_SERIAL.format(i) for i in range(inverters)]
+    relay_serials = [RELAY_SERIAL.format(i) for i in range(relays)]
+    battery_serials = [BATTERY_SERIAL.format(i) for i in range(batteries)]
+
+    # inventory.json
+    inventory = _load(test_data, "inventory")
+    templates = _inventory_templates(inventory)
+    devices = {"PCU": inverter_serials, "NSRB": relay_serials}
+    for group in inventory:
+        serials = devices.get(group["type"])
+        if serials is None or not templates[group["type"]]:
+            continue
+        template = templates[group["type"]][0]
+        group["devices"] = []
+        for index, serial in enumerate(serials):
+            device = copy.deepcopy(template)
+            device["serial_num"] = serial
+            device["chaneid"] = template["chaneid"] + index
+            device["last_rpt_date"] = str(int(template["last_rpt_date"]) - index % 300)
+            group["devices"].append(device)
+
+    # device_data
+    device_data = _load(test_data, "device_data")
+    pcu_template = next(
+        d
+        for d in device_data.values()
+        if isinstance(d, dict) and d.get("devName") == "pcu"
+    )
+    nsrb_template = next(
+        d
+        for d in device_data.values()
+        if isinstance(d, dict) and d.get("devName") == "nsrb"
+    )
+    device_data = {}
+    for index, serial in enumerate(inverter_serials):
+        device = copy.deepcopy(pcu_template)
+        device["sn"] = serial
+        channel = device["channels"][0]
+        channel["watts"]["now"] = _vary(channel["watts"]["now"], rng)
+        channel["wattHours"]["today"] = _vary(channel["wattHours"]["today"], rng)
+        channel["lastReading"]["acCurrentInmA"] = _vary(
+            channel["lastReading"]["acCurrentInmA"], rng
+        )
+        device_data[str(PCU_DEVICE_ID + 256 * index)] = device
+    for index, serial in enumerate(relay_serials):
+        device = copy.deepcopy(nsrb_template)
+        device["sn"] = serial
+        device_data[str(NSRB_DEVICE_ID + 256 * index)] = device
+    device_data["deviceCount"] = inverters + relays
+    device_data["deviceDataLimit"] = inverters + relays
+
+    # devstatus
+    devstatus = _load(test_data, "devstatus")
+    pcu_values = devstatus["pcu"]["values"][0]
+    devstatus["pcu"]["values"] = []
+    for index, serial in enumerate(inverter_serials):
+        values = list(pcu_values)
+        values[0] = serial
+        values[5] = pcu_values[5] - index % 300  # reportDate
+        values[-1] = _vary(pcu_values[-1], rng)  # acPowerINmW
+        devstatus["pcu"]["values"].append(values)
+    nsrb_values = devstatus["nsrb"]["values"][0]
+    devstatus["nsrb"]["values"] = [
+        [serial] + nsrb_values[1:] for serial in relay_serials
+    ]
+    for counter, count in (("pcu", inverters), ("nsrb", relays)):
+        for field in devstatus["counters"][counter]:
+            if field != "ctrlsGone":
+                devstatus["counters"][counter][field] = count
+    devstatus["counters"]["nsrb"]["chansProducing"] = 0
+
+    # production_inverters
+    production_template = _load(test_data, "production_inverters")[0]
+    production_inverters = []
+    for index, serial in enumerate(inverter_serials):
+        inverter = dict(production_template)
+        inverter["serialNumber"] = serial
+        inverter["lastReportDate"] = production_template["lastReportDate"] - index % 300
+        inverter["lastReportWatts"] = _vary(production_template["lastReportWatts"], rng)
+        production_inverters.append(inverter)
+
+    # ensemble_inventory
+    ensemble_inventory = _load(test_data, "ensemble_inventory")
+    for group in ensemble_inventory:
+        if group.get("type") != "ENCHARGE" or not group["devices"]:
+            continue
+        template = group["devices"][0]
+        group["devices"] = []
+        for serial in battery_serials:
+            battery = copy.deepcopy(template)
+            battery["serial_num"] = serial
+            battery["percentFull"] = rng.randint(5, 100)
+            group["devices"].append(battery)
+
+    # pcu_comm_check
+    pcu_comm_check = {serial: rng.randint(3, 5) for serial in inverter_serials}
+
+    return {
+        "endpoint_inventory.json": inventory,
+        "endpoint_device_data.json": device_data,
+        "endpoint_devstatus.json": devstatus,
+        "endpoint_production_inverters.json": production_inverters,
+        "endpoint_ensemble_inventory.json": ensemble_inventory,
+        "endpoint_pcu_comm_check.json": pcu_comm_check,
+    }
+
+
+def base_counts(test_data=TEST_DATA):
+    """Return (inverters, relays, batteries) of the fixtures in test_data."""
+    inventory = _inventory_templates(_load(test_data, "inventory"))
+    batteries = sum(
+        len(group["devices"])
+        for group in _load(test_data, "ensemble_inventory")
+        if group.get("type") == "ENCHARGE"
+    )
+    return len(inventory["PCU"]), len(inventory["NSRB"]), batteries
+
+
+def write(directory, inverters, relays, batteries, test_data=TEST_DATA, seed=0):
+    """Write a complete fixture directory for a fleet of this size."""
+    os.makedirs(directory, exist_ok=True)
+    for filename in os.listdir(test_data):
+        shutil.copy(os.path.join(test_data, filename), directory)
+
+    for filename, data in generate(
+        inverters, relays, batteries, test_data, seed
+    ).items():
+        with open(os.path.join(directory, filename), "w") as f:
+            json.dump(data, f, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory")
+    parser.add_argument("--inverters", type=int)
+    parser.add_argument("--relays", type=int)
+    parser.add_argument("--batteries", type=int)
+    parser.add_argument(
+        "--scale", type=float, default=1, help="multiply the test_data device counts"
+    )
+    parser.add_argument("--test-data", default=TEST_DATA)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    counts = [round(count * args.scale) for count in base_counts(args.test_data)]
+    inverters = counts[0] if args.inverters is None else args.inverters
+    relays = counts[1] if args.relays is None else args.relays
+    batteries = counts[2] if args.batteries is None else args.batteries
+
+    write(args.directory, inverters, relays, batteries, args.test_data, args.seed)
+    print(
+        f"Wrote fixtures for {inverters} inverters, {relays} relays "
+        f"and {batteries} batteries to {args.directory}"
+    )
+
+
+if __name__ == "__main__":
+    main()
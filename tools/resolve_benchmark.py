@@ -0,0 +1,109 @@
+"""Microbenchmark of EnvoyData.all_values for the three data classes.
+
+The fixtures of test_data/ (or a fleet of tools/generate_fleet.py with --scale)
+are parsed once, without requests, and all_values is timed:
+
+- compiled: every value resolved with the compiled jsonpath accessors
+- jsonpath: every value resolved with the jsonpath library, as before the paths
+  were compiled
+- memoized: all_values again without new endpoint data, which reuses the values
+
+    python tools/resolve_benchmark.py
+    python tools/resolve_benchmark.py --scale 100 --token-types installer
+"""
+
+import argparse
+import importlib
+import os
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+import generate_fleet
+from benchmark import DATA_CLASSES, TOKEN_TYPES, envoy_reader
+
+envoy_test_data = importlib.import_module("enphase_envoy.envoy_test_data")
+MODES = ("compiled", "jsonpath", "memoized")
+
+
+def _data(data_class, token_type, test_data):
+    """Return an EnvoyData of data_class with all fixtures of test_data."""
+    reader = envoy_reader.EnvoyReader("127.0.0.1", inverters=True)
+    reader.token_type = token_type
+    data = getattr(envoy_reader, data_class)(reader)
+    for key, endpoint in envoy_test_data.ENVOY_ENDPOINTS.items():
+        filename = os.path.join(test_data, os.path.basename(endpoint["url"]))
+        if os.path.exists(filename):
+            data.set_endpoint_data(f"endpoint_{key}", envoy_reader.FileData(filename))
+    return data
+
+
+def _time(data, repeat, mode):
+    """Return the median time of all_values in this mode."""
+    times = []
+    for _ in range(repeat):
+        if mode != "memoized":
+            data._values = {}
+        start = time.perf_counter()
+        data.all_values
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def _uncompiled(path):
+    return lambda obj: envoy_reader.jsonpath(obj, path)
+
+
+def benchmark(data_class, token_type, test_data, repeat):
+    data = _data(data_class, token_type, test_data)
+    result = {"values": len(data.all_values)}
+    for mode in MODES:
+        if mode == "jsonpath":
+            with mock.patch.object(envoy_reader, "compile_jsonpath", _uncompiled):
+                result[mode] = _time(data, repeat, mode)
+        else:
+            result[mode] = _time(data, repeat, mode)
+    return result
+
+
+def _format(data_class, token_type, result):
+    return f"{data_class:<19} {token_type:<9} {result['values']:>4} values  " + (
+        "  ".join(f"{mode} {result[mode] * 1000:8.2f} ms" for mode in MODES)
+    )
+
+
+def run(data_classes, token_types, scale, repeat):
+    with tempfile.TemporaryDirectory() as test_data:
+        if scale == 1:
+            test_data = generate_fleet.TEST_DATA
+        else:
+            counts = (round(count * scale) for count in generate_fleet.base_counts())
+            generate_fleet.write(test_data, *counts)
+
+        for data_class in data_classes:
+            for token_type in token_types:
+                result = benchmark(data_class, token_type, test_data, repeat)
+                print(_format(data_class, token_type, result), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data-classes", default=",".join(DATA_CLASSES))
+    parser.add_argument("--token-types", default=",".join(TOKEN_TYPES))
+    parser.add_argument(
+        "--scale", type=float, default=1, help="fleet scale factor, see generate_fleet"
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="calls per mode")
+    args = parser.parse_args()
+
+    run(
+        args.data_classes.split(","),
+        args.token_types.split(","),
+        args.scale,
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()
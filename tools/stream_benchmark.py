@@ -0,0 +1,349 @@
+"""Benchmark the /stream/meter parsing of the EnvoyReader.
+
+A recording of the meter stream (made with EnvoyReader.run_stream(record=...),
+or generated from the events of tools/envoy_simulator.py at the 1 event per
+second of an Envoy) is replayed with StreamReplay by a local HTTP stand-in for
+the Envoy. The EnvoyReader reads it with httpx through the same code as the real
+stream (SSEFrameParser, json and StreamData), and the benchmark measures:
+
+- events_per_second and bytes_per_second received
+- cpu_per_event: CPU time of the event loop thread per event
+- parse_per_event: CPU time of SSEFrameParser.feed() per event
+
+With --allocations it measures the memory of StreamData instead, traced with
+tracemalloc over the events of the replay: the median peak memory and the blocks
+that stay allocated per event, for updating one StreamData in place (as the
+reader does) and for a new StreamData per event (as for stream subscribers).
+
+With --entities it replays the recording (10 events per second at the default
+speed) to stand-ins for the live entities, which spend --write-cost ms per state
+write. Every event changes every entity, as without the aggregation window of the
+integration. It counts the state writes, and measures the latency of the event
+loop (how late a 1 ms sleep wakes up), both when every change is written
+directly and with the EntityWriteBatcher of the integration (entity_writes.py).
+--burst puts several events in one chunk, like the Envoy does after a hiccup.
+
+    python tools/stream_benchmark.py --speed 10 --events 600
+    python tools/stream_benchmark.py --recording stream.bin --speed 0
+    python tools/stream_benchmark.py --allocations
+    python tools/stream_benchmark.py --entities --burst 3
+
+A speed of 0 replays as fast as possible, which gives the maximum throughput.
+The stand-in runs in a separate thread, so its CPU time is not included.
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmark import envoy_reader
+from envoy_simulator import StreamSource
+
+EntityWriteBatcher = importlib.import_module(
+    "enphase_envoy.entity_writes"
+).EntityWriteBatcher
+
+PROBE_INTERVAL = 0.001  # seconds, of the event loop latency probe
+
+
+def write_recording(filename, events, interval=1.0, burst=1, seed=0):
+    """Write a recording of simulator events, interval seconds apart.
+
+    With a burst, that number of events is recorded together in one chunk."""
+    random.seed(seed)
+    source = StreamSource()
+    with open(filename, "wb") as file:
+        file.write(envoy_reader.STREAM_RECORDING_MAGIC)
+        for index in range(0, events, burst):
+            chunk = b"".join(source.event() for _ in range(min(burst, events - index)))
+            file.write(
+                envoy_reader.STREAM_RECORD_HEADER.pack(index * interval, len(chunk))
+            )
+            file.write(chunk)
+
+
+def start_stand_in(recording, speed):
+    """Serve the recording as /stream/meter, returns (server, url)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            asyncio.run(self.replay())
+            self.close_connection = True
+
+        async def replay(self):
+            async for chunk in envoy_reader.StreamReplay(
+                recording, speed
+            ).aiter_bytes():
+                self.wfile.write(chunk)
+                self.wfile.flush()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/stream/meter"
+
+
+async def benchmark(url):
+    """Read the stream at url with an EnvoyReader, returns the measurements."""
+    reader = envoy_reader.EnvoyReader("127.0.0.1")
+    parser = reader._stream_parser
+    feed = parser.feed
+    counts = {"events": 0, "bytes": 0, "parse": 0}
+
+    def timed_feed(chunk):
+        counts["bytes"] += len(chunk)
+        start = time.thread_time()
+        try:
+            return feed(chunk)
+        finally:
+            counts["parse"] += time.thread_time() - start
+
+    def callback(stream_data):
+        counts["events"] += 1
+
+    parser.feed = timed_feed
+    client = reader.async_client  # create the client outside of the measurement
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    async with client.stream("GET", url) as response:
+        await reader._read_stream(response.aiter_bytes(), callback)
+    cpu = time.thread_time() - cpu
+    wall = time.perf_counter() - wall
+    await reader.aclose()
+
+    events = max(counts["events"], 1)
+    return {
+        "events": counts["events"],
+        "bytes": counts["bytes"],
+        "malformed_frames": parser.malformed_frames,
+        "wall": wall,
+        "events_per_second": counts["events"] / wall,
+        "bytes_per_second": counts["bytes"] / wall,
+        "cpu_per_event": cpu / events,
+        "parse_per_event": counts["parse"] / events,
+    }
+
+
+def run(recording, speed):
+    server, url = start_stand_in(recording, speed)
+    try:
+        return asyncio.run(benchmark(url))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+async def _readings(recording):
+    """Return the decoded events of the recording."""
+    parser = envoy_reader.SSEFrameParser()
+    readings = []
+    async for chunk in envoy_reader.StreamReplay(recording, speed=0).aiter_bytes():
+        readings.extend(json.loads(data) for data in parser.feed(chunk))
+    return readings
+
+
+def allocations(recording):
+    """Trace the memory of StreamData for the events of the recording."""
+    readings = asyncio.run(_readings(recording))
+    events = max(len(readings), 1)
+    results = {"events": len(readings)}
+    for mode in ("update", "new"):
+        stream_data = envoy_reader.StreamData()
+        kept = []
+        peaks = []
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            for reading in readings:
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+                if mode == "update":
+                    stream_data.update(reading)
+                else:
+                    kept.append(envoy_reader.StreamData(reading))
+                peaks.append(tracemalloc.get_traced_memory()[1] - current)
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+
+        # Only count the blocks allocated by envoy_reader.py
+        retained = after.filter_traces(
+            [tracemalloc.Filter(True, envoy_reader.__file__)]
+        ).compare_to(before, "filename")
+        results[mode] = {
+            "peak_memory_per_event": statistics.median(peaks or [0]),
+            "retained_memory_per_event": sum(stat.size_diff for stat in retained)
+            / events,
+            "retained_blocks_per_event": sum(stat.count_diff for stat in retained)
+            / events,
+        }
+    return results
+
+
+def _format_allocations(result):
+    return "\n".join(
+        f"{mode:<6} {result['events']} events: "
+        f"peak {result[mode]['peak_memory_per_event']} bytes/event, "
+        f"retained {result[mode]['retained_blocks_per_event']:.2f} blocks/event "
+        f"({result[mode]['retained_memory_per_event']:.0f} bytes)"
+        for mode in ("update", "new")
+    )
+
+
+class Entity:
+    """Stand-in for a live entity, a state write costs write_cost seconds."""
+
+    def __init__(self, write_cost, counts):
+        self.write_cost = write_cost
+        self.counts = counts
+
+    def async_write_ha_state(self):
+        self.counts["writes"] += 1
+        end = time.perf_counter() + self.write_cost
+        while time.perf_counter() < end:
+            pass
+
+
+async def _entity_writes(recording, speed, write_cost, batched):
+    reader = envoy_reader.EnvoyReader("127.0.0.1")
+    reader.stream_replay = envoy_reader.StreamReplay(recording, speed)
+    counts = {"events": 0, "writes": 0}
+    entities = {
+        (attr, phase, field): Entity(write_cost, counts)
+        for _, attr in envoy_reader.STREAM_METERS
+        for _, phase in envoy_reader.STREAM_PHASES
+        for field in envoy_reader.StreamData.PhaseData.__slots__
+    }
+    if batched:
+        write = EntityWriteBatcher(asyncio.get_running_loop()).schedule_write
+    else:
+        write = Entity.async_write_ha_state
+
+    def callback(stream_data):
+        counts["events"] += 1
+        for (attr, phase, _), entity in entities.items():
+            if phase in getattr(stream_data, attr):
+                write(entity)
+
+    latencies = []
+
+    async def probe():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            latencies.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+    probe_task = asyncio.create_task(probe())
+    await reader.stream_reader(meter_callback=callback)
+    await asyncio.sleep(PROBE_INTERVAL)  # the last batched writes
+    probe_task.cancel()
+    await reader.aclose()
+
+    latencies.sort()
+    return {
+        "events": counts["events"],
+        "writes": counts["writes"],
+        "writes_per_event": counts["writes"] / max(counts["events"], 1),
+        "latency_median": statistics.median(latencies),
+        "latency_p99": latencies[int(len(latencies) * 0.99)],
+        "latency_max": latencies[-1],
+    }
+
+
+def entity_writes(recording, speed, write_cost):
+    """Count the entity writes of the recording, unbatched and batched."""
+    return {
+        mode: asyncio.run(_entity_writes(recording, speed, write_cost, batched))
+        for mode, batched in (("unbatched", False), ("batched", True))
+    }
+
+
+def _format_entity_writes(result):
+    return "\n".join(
+        f"{mode:<9} {result[mode]['events']} events: {result[mode]['writes']} writes "
+        f"({result[mode]['writes_per_event']:.1f}/event), event loop latency "
+        f"median {result[mode]['latency_median'] * 1000:.2f} ms, "
+        f"p99 {result[mode]['latency_p99'] * 1000:.2f} ms, "
+        f"max {result[mode]['latency_max'] * 1000:.2f} ms"
+        for mode in ("unbatched", "batched")
+    )
+
+
+def _format(result):
+    return (
+        f"{result['events']} events ({result['malformed_frames']} malformed) "
+        f"in {result['wall']:.2f} s: {result['events_per_second']:.1f} events/s, "
+        f"{result['bytes_per_second'] / 1024:.1f} KiB/s, "
+        f"cpu {result['cpu_per_event'] * 1e6:.1f} us/event "
+        f"(parser {result['parse_per_event'] * 1e6:.1f} us)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--recording", help="default: generated simulator events")
+    parser.add_argument(
+        "--events", type=int, default=600, help="events of the generated recording"
+    )
+    parser.add_argument(
+        "--speed", type=float, default=10, help="replay speed, 0 is unthrottled"
+    )
+    parser.add_argument(
+        "--allocations", action="store_true", help="trace the memory of StreamData"
+    )
+    parser.add_argument(
+        "--entities", action="store_true", help="count the entity state writes"
+    )
+    parser.add_argument(
+        "--write-cost", type=float, default=0.05, help="ms per entity state write"
+    )
+    parser.add_argument(
+        "--burst", type=int, default=1, help="events per chunk of the recording"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.allocations:
+        measure, format_result = allocations, _format_allocations
+    elif args.entities:
+        measure = partial(
+            entity_writes, speed=args.speed, write_cost=args.write_cost / 1000
+        )
+        format_result = _format_entity_writes
+    else:
+        measure, format_result = partial(run, speed=args.speed), _format
+    if args.recording:
+        result = measure(args.recording)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            recording = os.path.join(directory, "stream.bin")
+            write_recording(recording, args.events, burst=args.burst)
+            result = measure(recording)
+
+    result = {"recording": args.recording, "speed": args.speed, **result}
+    print(format_result(result))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()